@@ -1,18 +1,87 @@
 from __future__ import annotations
 
+import hashlib
+import re
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Iterable, Optional, Sequence
 from xml.etree import ElementTree as ET
 
 from anki import collection, models
-from aqt import mw
+from anki.collection import AddNoteRequest
+from anki.utils import split_fields
+
+from .tones import normalise_pinyin
 
 if TYPE_CHECKING:
     from anki.cards import Card, CardId
+    from anki.collection import Collection
     from anki.decks import Deck, DeckId
     from anki.notes import Note, NoteId
 
 NOTE_TYPE_NAME = "PlecoImports"
+NOTE_TYPE_FINGERPRINT_KEY = "plecoImportFingerprint" # NoteType key that holds the hash of the fields, templates and CSS last applied.
+
+NORMALISED_SYLLABLE_RE = re.compile(r"[a-z]+[1-5]") # A syllable of a reading in the form normalise_pinyin returns.
+# The syllables that earlier versions of the add-on dropped when converting a reading to tone marks: single-letter
+# syllables (a, e, o) and, since only a capital Ü was dropped but case is normalised away, any syllable with a ü.
+LEGACY_DROPPED_SYLLABLE_RE = re.compile(r"[aeo][1-5]|[a-z]*v[a-z]*[1-5]")
+
+def main_collection() -> Collection:
+    """Returns the collection that is open in Anki's main window."""
+    from aqt import mw
+    return mw.col
+
+def deck_notes(col: Collection, model_id: models.NotetypeId, deck_id: DeckId) -> list[tuple[NoteId, list[str]]]:
+    """Returns the ID and field values of every note of the given NoteType that has cards in the given deck,
+    including cards moved from it into a filtered deck, as a did: search would.
+    The notes are read with a single query, without going through the search engine."""
+    return [(note_id, split_fields(flds)) for note_id, flds in col.db.all(
+        "select id, flds from notes where mid = ? and id in (select nid from cards where did = ? or odid = ?)", 
+        model_id, deck_id, deck_id)]
+
+def reset_cards(col: Collection, card_ids: list[CardId]):
+    """Sets the scheduling information to "new" for each card whose ID is in the given list, whichever deck it's in."""
+    if card_ids:
+        col.sched.schedule_cards_as_new(card_ids)
+
+def note_key(field_values: Sequence[str]) -> str:
+    """Returns the key that identifies a note within a deck: its headword, the first field, along with its reading, 
+    the second field, normalised to tone numbers. Homographs with different readings get different keys, 
+    while a reading written with tone marks or numbers, or in another case or spacing, gets the same key."""
+    return f"{field_values[0]}\x1f{normalise_pinyin(field_values[1])}"
+
+def legacy_key_index(keys: Iterable[str]) -> dict[str, list[str]]:
+    """Groups the given note keys by headword, for find_legacy_key()."""
+    index: dict[str, list[str]] = {}
+    for key in keys:
+        index.setdefault(key.split("\x1f", 1)[0], []).append(key)
+    return index
+
+def find_legacy_key(keys_by_headword: dict[str, list[str]], key: str) -> Optional[str]:
+    """Returns the key of an existing note that an earlier version of the add-on imported from the same card as
+    the given key, or None. Those versions dropped some syllables from readings (see LEGACY_DROPPED_SYLLABLE_RE),
+    so a note they imported has the same headword but a reading that is missing only such syllables.
+    Of several such notes, the one whose reading is missing the fewest syllables is returned."""
+    headword, reading = key.split("\x1f", 1)
+    syllables = NORMALISED_SYLLABLE_RE.findall(reading)
+    best: Optional[str] = None
+    best_length = -1
+    for candidate in keys_by_headword.get(headword, ()):
+        candidate_syllables = NORMALISED_SYLLABLE_RE.findall(candidate.split("\x1f", 1)[1])
+        if len(candidate_syllables) < len(syllables) and len(candidate_syllables) > best_length \
+                and is_legacy_reading(candidate_syllables, syllables):
+            best, best_length = candidate, len(candidate_syllables)
+    return best
+
+def is_legacy_reading(legacy: list[str], syllables: list[str]) -> bool:
+    """Returns true if the syllables of `legacy` are those of `syllables`, in order, with only droppable ones missing."""
+    i = 0
+    for syllable in syllables:
+        if i < len(legacy) and legacy[i] == syllable:
+            i += 1
+        elif not LEGACY_DROPPED_SYLLABLE_RE.fullmatch(syllable):
+            return False
+    return i == len(legacy)
 
 @dataclass
 class CardTemplate:
@@ -60,6 +129,11 @@ class CardTemplates:
         for card_type in  template_files:
             contents = (grab_contents(side) for side in card_type)
             self.templates.append(CardTemplate(*contents))
+
+    def fingerprint(self, ordered_fields: list[str]) -> str:
+        """Returns a hash of the given fields along with these templates and CSS."""
+        content = "\x1f".join([*ordered_fields, self.css, *(side for t in self.templates for side in (t.front, t.back))])
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
         
 
 class AnkiNotes:
@@ -67,11 +141,17 @@ class AnkiNotes:
     as well as the creation of notes that use said NoteType.
     """
 
-    def __init__(self, model_name: str, ordered_fields: list[str], templates: CardTemplates):
+    def __init__(self, model_name: str, ordered_fields: list[str], templates: CardTemplates, col: Optional[Collection] = None):
         """Defines the content of the NoteType. If the NoteType already exists, 
-        its fields and templates are overwritten with those provided."""
-        collection = mw.col
+        its fields and templates are overwritten with those provided.
+        
+        :param col: The collection to work on. Defaults to the collection open in Anki's main window."""
+        self.col = collection = col if col is not None else main_collection()
         self.fields = ordered_fields
+        # Maps each deck ID to the IDs of the notes in it, by note_key(). Built on first use by duplicate_index().
+        self._duplicates: Optional[dict[DeckId, dict[str, list[NoteId]]]] = None
+        # Maps each deck ID to its duplicate keys by headword, for find_legacy_key(). Built on a deck's first new card.
+        self._legacy_keys: dict[DeckId, dict[str, list[str]]] = {}
 
         model_manager = collection.models
         # Create the Note Type (model) if it doesn't already exist.
@@ -80,12 +160,23 @@ class AnkiNotes:
         if self.model is None:
             self.model = model_manager.new(model_name)
             new = True
+
+        # Updating a NoteType can regenerate cards and force a full sync, so skip it when nothing has changed
+        # since the NoteType was last set up, either in the add-on or by the user in Anki.
+        fingerprint = templates.fingerprint(ordered_fields)
+        if not new and self.model.get(NOTE_TYPE_FINGERPRINT_KEY) == fingerprint and self.matches(ordered_fields, templates):
+            return
         
-        # Add the listed fields to the Note Type.
+        # Add the listed fields to the Note Type, and move them ahead of any others, in order.
+        existing_fields = set(model_manager.field_names(self.model))
         for f in ordered_fields:
-            if f not in model_manager.field_names(self.model):
+            if f not in existing_fields:
                 field = model_manager.new_field(f)
                 model_manager.add_field(self.model, field)
+        for i, name in enumerate(ordered_fields):
+            if model_manager.field_names(self.model).index(name) != i:
+                field = next(field for field in self.model["flds"] if field["name"] == name)
+                model_manager.reposition_field(self.model, field, i)
 
         if templates.css:
             self.model["css"] = templates.css
@@ -102,11 +193,25 @@ class AnkiNotes:
             else:
                 model_manager.add_template(self.model, templ)
 
+        # Store the fingerprint with the NoteType. Anki keeps unknown NoteType keys, so it syncs along with it.
+        self.model[NOTE_TYPE_FINGERPRINT_KEY] = fingerprint
         if new:
             model_manager.add_dict(self.model)
         else:
             model_manager.update_dict(self.model)
 
+    def matches(self, ordered_fields: list[str], templates: CardTemplates) -> bool:
+        """Returns true if the NoteType's first fields are the given fields, in order, and its card templates and CSS 
+        are the given ones. The NoteType may have been changed in Anki since the add-on last set it up."""
+        model = self.model
+        return (
+            self.col.models.field_names(model)[:len(ordered_fields)] == ordered_fields
+            and (not templates.css or model.get("css") == templates.css)
+            and len(model["tmpls"]) >= len(templates.templates)
+            and all(current["qfmt"] == template.front and current["afmt"] == template.back 
+                    for current, template in zip(model["tmpls"], templates.templates))
+        )
+
     @property
     def id(self) -> models.NotetypeId:
         """Returns the ID of the NoteType that this model represents."""
@@ -122,52 +227,111 @@ class AnkiNotes:
         
         :param deck_id: The ID of the deck to which to add the note.
         :param card: A dictionary that maps field names to field values for the note.
-        :param overwrite: If true, for instances in which the headword of a note already exists in the deck, 
+        :param overwrite: If true, for instances in which the headword and reading of a note already exist in the deck, 
                           overwrite its content. Ignore otherwise.
 
         :return A list of tuples. Each tuple represents one note created / modified and contains the note's ID 
-                and whether its headword already existed in the deck.
+                and whether its headword and reading already existed in the deck.
         """
-        collection = mw.col
-        field_values = [card[f] for f in self.fields]
+        return self.create_notes(deck_id, [card], overwrite)
 
-        dupe_ids = collection.find_notes(
-            collection.build_search_string(f"{self.fields[0]}:{field_values[0]} AND note:{self.name} AND did:{deck_id}")
-        )
+    def create_notes(self, deck_id: DeckId, cards: Sequence[dict[str, str]], overwrite: bool=False) -> list[tuple[NoteId, bool]]:
+        """Creates notes for a batch of cards and returns the ID of each note created / modified and whether it already existed in the deck.
+        Duplicates are found in the duplicate_index(), and notes are added and updated with one call each per batch.
+        
+        :param deck_id: The ID of the deck to which to add the notes.
+        :param cards: A sequence of dictionaries that map field names to field values, one per note.
+        :param overwrite: If true, for instances in which the headword and reading of a note already exist in the deck, 
+                          overwrite its content. Ignore otherwise.
 
-        # If there's duplicates and they aren't being modified, no action needs to be taken.
-        if dupe_ids and not overwrite:
-            return []
+        :return A list of tuples, in the order of the given cards. Each tuple represents one note created / modified 
+                and contains the note's ID and whether its headword and reading already existed in the deck.
+        """
+        rows = [[card[f] for f in self.fields] for card in cards]
+        return [modified for card_notes in self.create_notes_by_card(deck_id, rows, overwrite) for modified in card_notes]
 
-        modified_ids: list[tuple[NoteId, bool]] = []
-        # Update all duplicates with the newly given field values.
-        if dupe_ids:
-            notes: list[Note] = []
-            for note_id in dupe_ids:
-                note = collection.get_note(note_id)
-                note.fields = field_values
-                notes.append(note)
-                modified_ids.append((note_id, True))
-            collection.update_notes(notes)
-        # Create a new note with the given field values.
-        else:
-            note = collection.new_note(self.model)
-            note.fields = field_values
-            collection.add_note(note, deck_id)
+    def create_notes_by_card(self, deck_id: DeckId, rows: Sequence[Sequence[str]], overwrite: bool=False) -> list[list[tuple[NoteId, bool]]]:
+        """Behaves as create_notes, but takes each card as a row of field values in the order of `self.fields`, 
+        and groups the returned tuples by card. The returned list is aligned with the given rows; 
+        a card that didn't result in any note being written (an ignored duplicate) has an empty list."""
+        collection = self.col
+        dupe_ids = self.duplicate_index().setdefault(deck_id, {})
+
+        modified: list[list[tuple[Note, bool]]] = [] # Note IDs aren't known until new notes are added, so hold onto the notes themselves.
+        updated_notes: dict[NoteId, Note] = {}      # Existing notes whose fields are overwritten.
+        new_notes: dict[str, Note] = {}             # New notes, keyed on their note_key().
+        for field_values in rows:
+            card_modified: list[tuple[Note, bool]] = []
+            modified.append(card_modified)
+
+            key = note_key(field_values)
+            if key not in dupe_ids and key not in new_notes:
+                # The card's note may have been imported by an earlier version, with a reading that's missing syllables.
+                if deck_id not in self._legacy_keys:
+                    self._legacy_keys[deck_id] = legacy_key_index(dupe_ids)
+                legacy_key = find_legacy_key(self._legacy_keys[deck_id], key)
+                if legacy_key is not None:
+                    dupe_ids[key] = dupe_ids[legacy_key]
+            # A card may also repeat within the batch, in which case the earlier card's new note is the duplicate.
+            if key in dupe_ids or key in new_notes:
+                # If there's duplicates and they aren't being modified, no action needs to be taken.
+                if not overwrite:
+                    continue
+                
+                # Update all duplicates with the newly given field values.
+                if key in new_notes:
+                    dupes = [new_notes[key]]
+                else:
+                    dupes = [updated_notes[note_id] if note_id in updated_notes else collection.get_note(note_id) 
+                             for note_id in dupe_ids[key]]
+                for note in dupes:
+                    note.fields[:len(field_values)] = field_values # Fields that the user added are kept.
+                    if note.id:
+                        updated_notes[note.id] = note
+                    card_modified.append((note, True))
+            # Create a new note with the given field values.
+            else:
+                note = collection.new_note(self.model)
+                note.fields[:len(field_values)] = field_values
+                new_notes[key] = note
+                card_modified.append((note, False))
+
+        if updated_notes:
+            collection.update_notes(list(updated_notes.values()))
+        if new_notes:
+            collection.add_notes([AddNoteRequest(note, deck_id) for note in new_notes.values()])
+            # Later batches find the new notes as duplicates.
+            for key, note in new_notes.items():
+                dupe_ids[key] = [note.id]
 
-            modified_ids.append((note.id, True))
+        return [[(note.id, dupe) for note, dupe in card_modified] for card_modified in modified]
 
-        return modified_ids
+    def duplicate_index(self) -> dict[DeckId, dict[str, list[NoteId]]]:
+        """Returns the IDs of the notes of this NoteType in each deck, keyed on the deck's ID and then on each note's
+        note_key(). The index is read with a single query the first time it's needed, and kept up to date with the
+        notes added through this object, so that duplicates are found with dictionary lookups rather than searches.
+        As with a did: search, a note whose cards are in a filtered deck is also indexed under their home deck."""
+        if self._duplicates is None:
+            index: dict[DeckId, dict[str, list[NoteId]]] = {}
+            for deck_id, note_id, flds in self.col.db.all(
+                    "select c.did, n.id, n.flds from notes n join cards c on c.nid = n.id where n.mid = ? "
+                    "union select c.odid, n.id, n.flds from notes n join cards c on c.nid = n.id where n.mid = ? and c.odid != 0",
+                    self.id, self.id):
+                index.setdefault(deck_id, {}).setdefault(note_key(split_fields(flds)), []).append(note_id)
+            self._duplicates = index
+        return self._duplicates
     
 
 class AnkiDeck:
     """This class provides an abstraction for manipulating an Anki deck with the provided name."""
 
-    def __init__(self, name):
+    def __init__(self, name, col: Optional[Collection] = None):
         """Initialises the deck that this class interfaces with.
         if no deck matches the provided name, one will be created.
+
+        :param col: The collection to work on. Defaults to the collection open in Anki's main window.
         """
-        collection = mw.col
+        self.col = collection = col if col is not None else main_collection()
 
         deck_id = collection.decks.id_for_name(name)
         if not deck_id:
@@ -185,16 +349,23 @@ class AnkiDeck:
     
     def cards_for_note(self, note_id: NoteId) -> list[CardId]:
         """Returns a list of all cards that were generated for the note with the given ID."""
-        collection = mw.col
+        collection = self.col
 
         return collection.find_cards(
             collection.build_search_string(f"nid:{note_id} AND did:{self.id}")
         )
 
+    def cards_for_notes(self, note_ids: Iterable[NoteId]) -> list[CardId]:
+        """Returns a list of all cards that were generated for the notes with the given IDs, using a single search."""
+        note_ids = list(note_ids)
+        if not note_ids:
+            return []
+        collection = self.col
+
+        return collection.find_cards(
+            collection.build_search_string(f"nid:{','.join(str(note_id) for note_id in note_ids)} AND did:{self.id}")
+        )
+
     def reset_cards(self, card_ids: list[CardId]):
         """Sets the scheduling information to "new" for each card whose ID is in the given list."""
-        if len(card_ids) == 0:
-            return
-        
-        collection = mw.col
-        collection.sched.schedule_cards_as_new(card_ids)
\ No newline at end of file
+        reset_cards(self.col, card_ids)
\ No newline at end of file
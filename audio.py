@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import math
+import os
+import struct
+import tempfile
+import wave
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from os.path import dirname, realpath
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+
+    from .pleco_import import CardBatch
+
+AUDIO_CACHE_DIR: str = dirname(realpath(__file__)) + "/user_files/audio_cache/" # Shared by every deck and import.
+AUDIO_WORKERS = 4 # The maximum number of clips synthesised at once.
+
+class AudioEngine(ABC):
+    """Synthesises Mandarin audio for a headword. Subclasses are registered in AUDIO_ENGINES by their name."""
+
+    name: str = ""
+    extension: str = "wav"
+
+    @abstractmethod
+    def synthesise(self, headword: str, pinyin: str, voice: str) -> bytes:
+        """Returns the contents of an audio file that pronounces the given headword and (tone-marked) pinyin."""
+
+class ToneWaveEngine(AudioEngine):
+    """A local stand-in engine that writes a short, deterministic WAV file with one tone per character of the headword.
+    It needs no network access or speech models, which makes it suitable for tests and benchmarks, but it doesn't
+    pronounce anything, so it is never used unless it's selected explicitly."""
+
+    name = "tones"
+    SAMPLE_RATE = 16000
+    SYLLABLE_SECONDS = 0.2
+
+    def synthesise(self, headword: str, pinyin: str, voice: str) -> bytes:
+        seed = hashlib.blake2b(f"{headword}\x1f{pinyin}\x1f{voice}".encode("utf-8"), digest_size=min(len(headword), 64) or 1).digest()
+        frames = b"".join(self.syllable_frames(220 + byte * 2) for byte in seed)
+
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.SAMPLE_RATE)
+            wav.writeframes(frames)
+        return buffer.getvalue()
+
+    @classmethod
+    @lru_cache(maxsize=256)
+    def syllable_frames(cls, frequency: int) -> bytes:
+        """Returns the 16-bit PCM frames of a sine tone at the given frequency, lasting one syllable."""
+        samples = int(cls.SAMPLE_RATE * cls.SYLLABLE_SECONDS)
+        return struct.pack(f"<{samples}h", *(int(12000 * math.sin(2 * math.pi * frequency * n / cls.SAMPLE_RATE)) for n in range(samples)))
+
+AUDIO_ENGINES: dict[str, type[AudioEngine]] = {
+    ToneWaveEngine.name: ToneWaveEngine,
+}
+
+class AudioStage:
+    """Fills in the audio field of imported cards. Clips are stored in a cache keyed by a hash of the headword,
+    pinyin, voice and engine, so each clip is only ever synthesised once, whichever deck or import needs it.
+    Clips missing from the collection's media folder are added together by flush()."""
+
+    def __init__(self, col: Collection, engine: AudioEngine, voice: str = "default", workers: int = AUDIO_WORKERS):
+        self.col = col
+        self.engine = engine
+        self.voice = voice
+        self.workers = workers
+        self.pending_media: dict[str, str] = {} # Maps media filenames to cached files that are yet to be added to the collection.
+
+    def clip_filename(self, headword: str, pinyin: str) -> str:
+        """Returns the content-addressed media filename of the clip for the given headword and pinyin."""
+        key = hashlib.blake2b(f"{self.engine.name}\x1f{self.voice}\x1f{headword}\x1f{pinyin}".encode("utf-8"), digest_size=16).hexdigest()
+        return f"pleco-{key}.{self.engine.extension}"
+
+    def set_audio_fields(self, batch: CardBatch):
+        """Sets the audio field of each card in the batch to its clip. The clips themselves are produced by generate()."""
+        batch.set_column("audio", [
+            f"[sound:{self.clip_filename(headword, pron)}]" for headword, pron in zip(batch.column("headword_sc"), batch.column("pron"))
+        ])
+
+    def generate(self, cards: Iterable[tuple[str, str]]):
+        """Synthesises, in a bounded thread pool, the clips that aren't cached yet for the given (headword, pinyin) pairs,
+        and queues every clip to be added to the collection's media."""
+        missing: dict[str, tuple[str, str]] = {}
+        for headword, pron in cards:
+            filename = self.clip_filename(headword, pron)
+            if filename in self.pending_media:
+                continue
+            self.pending_media[filename] = AUDIO_CACHE_DIR + filename
+            if not os.path.exists(AUDIO_CACHE_DIR + filename):
+                missing[filename] = (headword, pron)
+
+        if missing:
+            os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+            with ThreadPoolExecutor(self.workers) as pool:
+                list(pool.map(self._synthesise_to_cache, missing.keys(), missing.values()))
+
+    def _synthesise_to_cache(self, filename: str, card: tuple[str, str]):
+        data = self.engine.synthesise(*card, self.voice)
+        # Write to a temporary file first so that an interrupted import never leaves a truncated clip in the cache.
+        # Its name is unique, as two imports in the same process, e.g. the folder watcher's and the dialog's, 
+        # may write the same clip at once.
+        fd, temp_path = tempfile.mkstemp(dir=AUDIO_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, AUDIO_CACHE_DIR + filename)
+
+    def flush(self):
+        """Adds every queued clip that the collection's media folder doesn't already have."""
+        media = self.col.media
+        for filename, path in self.pending_media.items():
+            if not media.have(filename):
+                media.add_file(path)
+        self.pending_media.clear()
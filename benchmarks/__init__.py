@@ -0,0 +1,3 @@
+"""Benchmarks for the import pipeline that run on a plain Python install, without Anki.
+
+Run them from the add-on directory with `python -m benchmarks --help`."""
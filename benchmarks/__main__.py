@@ -0,0 +1,116 @@
+"""Measures the throughput and peak memory of each stage of the import pipeline on synthetic Pleco exports."""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from .addon import addon_module
+from .fake_collection import FakeCollection, install_stand_in_modules
+from .generate import synthetic_cards, write_cedict, write_txt_export, write_xml_export
+
+STAGES = ("parse_xml", "parse_txt", "convert", "enrich", "import")
+
+class StageResult(NamedTuple):
+    stage: str
+    cards: int
+    seconds: float
+    peak_bytes: int
+    collection: FakeCollection | None = None
+
+def measure(stage: str, run: Callable[[], tuple[int, FakeCollection | None]], memory: bool) -> StageResult:
+    """Times one run of the stage and, if `memory` is set, repeats it under tracemalloc to find its peak allocation.
+    The runs are separate because tracemalloc slows down allocation-heavy code considerably."""
+    start = time.perf_counter()
+    cards, collection = run()
+    seconds = time.perf_counter() - start
+
+    peak = 0
+    if memory:
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return StageResult(stage, cards, seconds, peak, collection)
+
+def stage_runners(size: int, workdir: Path) -> dict[str, Callable[[], tuple[int, FakeCollection | None]]]:
+    """Generates the exports for the given size and returns a function that runs each stage once."""
+    xml_file = str(workdir / f"export-{size}.xml")
+    txt_file = str(workdir / f"export-{size}.txt")
+    write_xml_export(xml_file, size)
+    write_txt_export(txt_file, size)
+    pinyin = [card.pron for card in synthetic_cards(size)]
+    cedict_file = str(workdir / f"cedict-{size}.u8")
+    write_cedict(cedict_file, size)
+
+    pleco_import = addon_module("pleco_import")
+    tones = addon_module("tones")
+
+    def parse(filename: str) -> tuple[int, None]:
+        return sum(len(batch) for batch in pleco_import.parse_pleco_file(filename, on_malformed=lambda *_: None)), None
+
+    def convert() -> tuple[int, None]:
+        tones._convert_numeric_word.cache_clear()
+        for sentence in pinyin:
+            tones.convert_numeric_sentence(sentence)
+        return len(pinyin), None
+
+    def enrich() -> tuple[int, None]:
+        # Keep the compiled dictionary out of the add-on's user files. It's compiled on the first run only.
+        cedict = addon_module("cedict")
+        cedict.CEDICT_INDEX_DIR = str(workdir / "cedict") + "/"
+        with cedict.CedictIndex.open(cedict_file) as dictionary:
+            for batch in pleco_import.parse_pleco_file(xml_file, on_malformed=lambda *_: None):
+                dictionary.enrich(batch)
+        return size, None
+
+    def import_xml() -> tuple[int, FakeCollection]:
+        collection = FakeCollection()
+        install_stand_in_modules(collection)
+        # Keep the content index out of the add-on's user files, and start every run from an empty one.
+        note_index = addon_module("note_index")
+        note_index.INDEX_DIR = tempfile.mkdtemp(dir=workdir) + "/"
+        addon_module("parse_cache").PARSE_CACHE_DIR = tempfile.mkdtemp(dir=workdir) + "/"
+        addon_module("import_report").LOG_FILE = str(workdir / "import_log.jsonl")
+        importer = addon_module("importer")
+        importer.import_pleco(xml_file, "Benchmark", importer.ImportConfig(overwrite=True, set_new=True), col=collection)
+        return size, collection
+
+    return {
+        "parse_xml": lambda: parse(xml_file),
+        "parse_txt": lambda: parse(txt_file),
+        "convert": convert,
+        "enrich": enrich,
+        "import": import_xml,
+    }
+
+def report(result: StageResult, size: int):
+    rate = result.cards / result.seconds if result.seconds else float("inf")
+    line = f"{size:>9} {result.stage:<10} {result.cards:>9} {result.seconds:>9.3f}s {rate:>12,.0f} cards/s"
+    if result.peak_bytes:
+        line += f" {result.peak_bytes / 2**20:>9.1f} MiB peak"
+    if result.collection is not None:
+        line += f"  searches={result.collection.searches} writes={result.collection.writes} ({dict(result.collection.counts)})"
+    print(line, flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="Numbers of cards to generate.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="Stages to measure.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run that measures peak memory.")
+    args = parser.parse_args()
+
+    # The import stage needs the stand-in collection in place before the add-on's Anki wrappers are imported.
+    install_stand_in_modules(FakeCollection())
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            runners = stage_runners(size, Path(workdir))
+            for stage in args.stages:
+                report(measure(stage, runners[stage], not args.no_memory), size)
+
+if __name__ == "__main__":
+    main()
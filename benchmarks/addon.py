@@ -0,0 +1,22 @@
+"""Loads the add-on's modules outside of Anki.
+
+The add-on's `__init__.py` adds its Tools menu action at import time, so the add-on directory is registered as a bare
+package under ADDON_PACKAGE without running it. Its submodules can then be imported with their relative imports intact."""
+from __future__ import annotations
+
+import importlib
+import sys
+import types
+from pathlib import Path
+from types import ModuleType
+
+ADDON_DIR = Path(__file__).resolve().parent.parent
+ADDON_PACKAGE = "pleco_anki"
+
+def addon_module(name: str) -> ModuleType:
+    """Imports and returns the add-on submodule with the given name, e.g. "pleco_import"."""
+    if ADDON_PACKAGE not in sys.modules:
+        package = types.ModuleType(ADDON_PACKAGE)
+        package.__path__ = [str(ADDON_DIR)]
+        sys.modules[ADDON_PACKAGE] = package
+    return importlib.import_module(f"{ADDON_PACKAGE}.{name}")
@@ -0,0 +1,279 @@
+"""An in-memory stand-in for Anki's `mw.col`, used to benchmark the import pipeline without a running Anki.
+
+Notes and cards are kept in an SQLite database that mirrors the columns of Anki's own `notes` and `cards` tables
+that the add-on reads through `col.db`. Searches understand only the subset of Anki's search syntax that the add-on
+generates. Every search and write is counted so that benchmarks can report how many collection calls a stage made.
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+import sys
+import time
+import types
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+FIELD_SEPARATOR = "\x1f"
+
+SEARCH_DID_RE = re.compile(r"did:(\d+)")
+SEARCH_NID_RE = re.compile(r"nid:([\d,]+)")
+SEARCH_NOTE_RE = re.compile(r"note:(\S+?)(?:\s|\)|$)")
+SEARCH_FIELD_RE = re.compile(r'"([^":]+):((?:[^"\\]|\\.)*)"')
+SEARCH_UNESCAPE_RE = re.compile(r"\\(.)")
+
+def ids2str(ids: Iterable[int]) -> str:
+    return "(" + ",".join(str(i) for i in ids) + ")"
+
+def split_fields(flds: str) -> list[str]:
+    return flds.split(FIELD_SEPARATOR)
+
+@dataclass
+class AddNoteRequest:
+    note: FakeNote
+    deck_id: int
+
+class FakeNote:
+    def __init__(self, model: dict, note_id: int = 0, fields: Optional[list[str]] = None):
+        self.id = note_id
+        self.mid = model["id"]
+        self.fields = fields if fields is not None else [""] * len(model["flds"])
+
+class FakeDB:
+    """Executes the add-on's raw SQL against the fake collection's SQLite tables."""
+
+    def __init__(self, collection: FakeCollection):
+        self.collection = collection
+        self.connection = collection.connection
+
+    def all(self, sql: str, *args: Any) -> list[tuple]:
+        self.collection.counts["db_query"] += 1
+        return self.connection.execute(sql, args).fetchall()
+
+    def list(self, sql: str, *args: Any) -> list:
+        return [row[0] for row in self.all(sql, *args)]
+
+    def scalar(self, sql: str, *args: Any) -> Any:
+        rows = self.all(sql, *args)
+        return rows[0][0] if rows else None
+
+class FakeModels:
+    def __init__(self, collection: FakeCollection):
+        self.collection = collection
+        self.models: dict[str, dict] = {}
+
+    def by_name(self, name: str) -> Optional[dict]:
+        return self.models.get(name)
+
+    def get(self, model_id: int) -> Optional[dict]:
+        return next((m for m in self.models.values() if m["id"] == model_id), None)
+
+    def new(self, name: str) -> dict:
+        return {"id": 0, "name": name, "flds": [], "tmpls": [], "css": ""}
+
+    def field_names(self, model: dict) -> list[str]:
+        return [f["name"] for f in model["flds"]]
+
+    def new_field(self, name: str) -> dict:
+        return {"name": name}
+
+    def add_field(self, model: dict, field: dict):
+        model["flds"].append(field)
+
+    def reposition_field(self, model: dict, field: dict, index: int):
+        model["flds"].remove(field)
+        model["flds"].insert(index, field)
+
+    def new_template(self, name: str) -> dict:
+        return {"name": name, "qfmt": "", "afmt": ""}
+
+    def add_template(self, model: dict, template: dict):
+        model["tmpls"].append(template)
+
+    def add_dict(self, model: dict):
+        self.collection.counts["model_write"] += 1
+        model["id"] = self.collection.next_id()
+        self.models[model["name"]] = model
+
+    def update_dict(self, model: dict):
+        self.collection.counts["model_write"] += 1
+        self.models[model["name"]] = model
+
+class FakeDeck:
+    def __init__(self):
+        self.name = ""
+
+class FakeDecks:
+    def __init__(self, collection: FakeCollection):
+        self.collection = collection
+        self.ids: dict[str, int] = {"Default": 1}
+
+    def id_for_name(self, name: str) -> Optional[int]:
+        return self.ids.get(name)
+
+    def new_deck(self) -> FakeDeck:
+        return FakeDeck()
+
+    def add_deck(self, deck: FakeDeck):
+        self.ids[deck.name] = self.collection.next_id()
+
+    def all_names_and_ids(self) -> list[types.SimpleNamespace]:
+        return [types.SimpleNamespace(name=name, id=deck_id) for name, deck_id in self.ids.items()]
+
+class FakeScheduler:
+    def __init__(self, collection: FakeCollection):
+        self.collection = collection
+
+    def schedule_cards_as_new(self, card_ids: list[int]):
+        self.collection.counts["reschedule"] += 1
+        self.collection.counts["cards_rescheduled"] += len(card_ids)
+
+class FakeMedia:
+    def __init__(self, collection: FakeCollection):
+        self.collection = collection
+        self.files: dict[str, bytes] = {}
+
+    def have(self, filename: str) -> bool:
+        return filename in self.files
+
+    def write_data(self, filename: str, data: bytes) -> str:
+        self.collection.counts["media_write"] += 1
+        self.files[filename] = data
+        return filename
+
+    def add_file(self, path: str) -> str:
+        filename = path.replace("\\", "/").rsplit("/", 1)[-1]
+        with open(path, "rb") as f:
+            return self.write_data(filename, f.read())
+
+class FakeCollection:
+    """A minimal, in-memory collection that records the number of searches and writes made against it."""
+
+    def __init__(self):
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.executescript("""
+            create table notes (id integer primary key, mid integer, mod integer, flds text, sfld text);
+            create table cards (id integer primary key, nid integer, did integer, odid integer, ord integer);
+            create index ix_notes_sfld on notes (sfld);
+            create index ix_cards_nid on cards (nid);
+        """)
+        self.counts: Counter[str] = Counter()
+        self._last_id = int(time.time() * 1000)
+
+        self.db = FakeDB(self)
+        self.models = FakeModels(self)
+        self.decks = FakeDecks(self)
+        self.sched = FakeScheduler(self)
+        self.media = FakeMedia(self)
+
+    @property
+    def searches(self) -> int:
+        return self.counts["find_notes"] + self.counts["find_cards"]
+
+    @property
+    def writes(self) -> int:
+        return self.counts["add_notes"] + self.counts["update_notes"] + self.counts["model_write"] + self.counts["reschedule"]
+
+    def next_id(self) -> int:
+        self._last_id += 1
+        return self._last_id
+
+    def build_search_string(self, *terms: str) -> str:
+        return " AND ".join(terms)
+
+    def new_note(self, model: dict) -> FakeNote:
+        return FakeNote(model)
+
+    def get_note(self, note_id: int) -> FakeNote:
+        self.counts["get_note"] += 1
+        mid, flds = self.connection.execute("select mid, flds from notes where id = ?", (note_id,)).fetchone()
+        return FakeNote(self.models.get(mid), note_id, split_fields(flds))
+
+    def add_notes(self, requests: list[AddNoteRequest]):
+        self.counts["add_notes"] += 1
+        self.counts["notes_added"] += len(requests)
+        for request in requests:
+            note = request.note
+            note.id = self.next_id()
+            self._write_note(note)
+            # One card per template; the reverse template only produces a card when its field is filled in.
+            model = self.models.get(note.mid)
+            names = [field["name"] for field in model["flds"]]
+            reverse = "reverse" in names and note.fields[names.index("reverse")]
+            card_count = 1 + (1 if len(model["tmpls"]) > 1 and reverse else 0)
+            for ordinal in range(card_count):
+                self.connection.execute("insert into cards values (?, ?, ?, 0, ?)", (self.next_id(), note.id, request.deck_id, ordinal))
+
+    def update_notes(self, notes: list[FakeNote]):
+        self.counts["update_notes"] += 1
+        self.counts["notes_updated"] += len(notes)
+        for note in notes:
+            self._write_note(note)
+
+    def _write_note(self, note: FakeNote):
+        self.connection.execute("insert or replace into notes values (?, ?, ?, ?, ?)",
+                                (note.id, note.mid, int(time.time()), FIELD_SEPARATOR.join(note.fields), note.fields[0]))
+
+    def find_notes(self, query: str) -> list[int]:
+        self.counts["find_notes"] += 1
+        sql, args = self._search_sql(query)
+        return [row[0] for row in self.connection.execute(f"select distinct n.id from notes n join cards c on c.nid = n.id where {sql}", args)]
+
+    def find_cards(self, query: str) -> list[int]:
+        self.counts["find_cards"] += 1
+        sql, args = self._search_sql(query)
+        return [row[0] for row in self.connection.execute(f"select c.id from cards c join notes n on c.nid = n.id where {sql}", args)]
+
+    def _search_sql(self, query: str) -> tuple[str, list]:
+        """Translates the subset of Anki's search syntax that the add-on uses into an SQL condition."""
+        conditions = ["1"]
+        args: list = []
+        if match := SEARCH_DID_RE.search(query):
+            # Like Anki's did: search, this also matches cards that are in a filtered deck but belong to this one.
+            conditions.append("(c.did = ? or c.odid = ?)")
+            args.extend([int(match.group(1))] * 2)
+        if match := SEARCH_NID_RE.search(query):
+            conditions.append(f"n.id in {ids2str(int(i) for i in match.group(1).split(','))}")
+        if match := SEARCH_NOTE_RE.search(query):
+            model = self.models.by_name(match.group(1).strip('"'))
+            conditions.append("n.mid = ?")
+            args.append(model["id"] if model else -1)
+        # Field searches are only ever made on the first (sort) field.
+        values = [SEARCH_UNESCAPE_RE.sub(r"\1", value) for _, value in SEARCH_FIELD_RE.findall(query)]
+        if values:
+            conditions.append(f"n.sfld in ({','.join('?' * len(values))})")
+            args.extend(values)
+        return " and ".join(conditions), args
+
+def install_stand_in_modules(collection: FakeCollection):
+    """Makes the add-on's imports of `anki` and `aqt` resolve to stand-ins backed by the given collection.
+    Real modules are left in place if they can be imported, with only `mw.col` replaced."""
+    try:
+        import aqt
+        import anki.collection
+    except ImportError:
+        anki_module = types.ModuleType("anki")
+        anki_module.__path__ = []
+        collection_module = types.ModuleType("anki.collection")
+        collection_module.AddNoteRequest = AddNoteRequest
+        collection_module.Collection = FakeCollection
+        utils_module = types.ModuleType("anki.utils")
+        utils_module.ids2str = ids2str
+        utils_module.split_fields = split_fields
+        models_module = types.ModuleType("anki.models")
+        anki_module.collection = collection_module
+        anki_module.utils = utils_module
+        anki_module.models = models_module
+        sys.modules.update({
+            "anki": anki_module, "anki.collection": collection_module,
+            "anki.utils": utils_module, "anki.models": models_module,
+        })
+
+        aqt = types.ModuleType("aqt")
+        aqt.mw = types.SimpleNamespace()
+        sys.modules["aqt"] = aqt
+
+    if aqt.mw is None:
+        aqt.mw = types.SimpleNamespace()
+    aqt.mw.col = collection
@@ -0,0 +1,77 @@
+"""Writes synthetic Pleco flashcard exports, in both the .xml and .txt formats, for benchmarking."""
+from __future__ import annotations
+
+import random
+from typing import Iterator, NamedTuple
+from xml.sax.saxutils import escape
+
+from .addon import addon_module
+
+CJK_FIRST = 0x4E00 # The range of CJK Unified Ideographs that headwords are drawn from.
+CJK_LAST = 0x9FFF
+PUA_MARKERS = ("\ueab1", "\ueab2", "\ueab3", "\ueab4") # Private Use Area code points of the kind Pleco puts in dictionary definitions.
+DEFINITION_WORDS = ("to", "be", "a", "the", "person", "study", "learn", "big", "small", "water", "eat", "go", "come", "see", "good", "country", "(literary)", "(coll.)")
+
+class SyntheticCard(NamedTuple):
+    headword: str
+    pron: str
+    defn: str
+    dict_type: bool
+
+def synthetic_cards(count: int, dict_ratio: float = 0.3, seed: int = 0) -> Iterator[SyntheticCard]:
+    """Yields `count` reproducible cards with 1-4 character headwords, numeric multi-syllable pinyin and
+    definitions of varying length. Roughly `dict_ratio` of them are dictionary cards with PUA markup."""
+    rng = random.Random(seed)
+    syllables = addon_module("tones").BASE_SYLLABLES.split()
+
+    for _ in range(count):
+        length = rng.choice((1, 2, 2, 2, 3, 4))
+        headword = "".join(chr(rng.randint(CJK_FIRST, CJK_LAST)) for _ in range(length))
+        pron = "".join(rng.choice(syllables) + str(rng.randint(1, 5)) for _ in range(length))
+        defn = " ".join(rng.choice(DEFINITION_WORDS) for _ in range(rng.randint(2, 40)))
+
+        dict_type = rng.random() < dict_ratio
+        if dict_type:
+            defn = f"{PUA_MARKERS[0]}{rng.choice(('noun', 'verb', 'adj.'))}{PUA_MARKERS[1]} {defn} {PUA_MARKERS[2]}e.g.{PUA_MARKERS[3]}"
+        yield SyntheticCard(headword, pron, defn, dict_type)
+
+def write_xml_export(filename: str, count: int, dict_ratio: float = 0.3, seed: int = 0):
+    """Writes a Pleco .xml export containing `count` synthetic cards."""
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<plecoflash formatversion="2" generator="benchmarks">\n')
+        f.write('<categories><category name="Benchmark"/></categories>\n<cards>\n')
+        for i, card in enumerate(synthetic_cards(count, dict_ratio, seed)):
+            dictref = f'<dictref dictid="PACE" entryid="{i}"/>' if card.dict_type else ""
+            f.write(
+                f'<card language="chinese"><entry><headword charset="sc">{card.headword}</headword>'
+                f'<pron type="hypy" tones="numbers">{card.pron}</pron><defn>{escape(card.defn)}</defn></entry>'
+                f'{dictref}<catassign category="Benchmark"/></card>\n'
+            )
+        f.write("</cards>\n</plecoflash>\n")
+
+def write_txt_export(filename: str, count: int, seed: int = 0):
+    """Writes a Pleco .txt export containing `count` synthetic custom cards, with syllables separated by spaces."""
+    with open(filename, "w", encoding="utf-8-sig") as f:
+        f.write("// Benchmark\n")
+        for card in synthetic_cards(count, 0, seed):
+            # The .txt format separates syllables, so split the numeric pinyin after each tone number.
+            pron = "".join(c + " " if c.isdigit() else c for c in card.pron).strip()
+            f.write(f"{card.headword}\t{pron}\t{card.defn}\n")
+
+def write_cedict(filename: str, count: int, dict_ratio: float = 0.3, seed: int = 0, extra_entries: int = 100_000):
+    """Writes a CC-CEDICT format dictionary with an entry for each dictionary card among the first `count` synthetic
+    cards, followed by `extra_entries` entries for other headwords, as in a full dictionary."""
+    rng = random.Random(seed + 1)
+    syllables = addon_module("tones").BASE_SYLLABLES.split()
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("# CC-CEDICT\n#! version=1\n")
+        for card in synthetic_cards(count, dict_ratio, seed):
+            if card.dict_type:
+                # CC-CEDICT separates syllables, so split the numeric pinyin after each tone number.
+                pron = "".join(c + " " if c.isdigit() else c for c in card.pron).strip()
+                f.write(f"{card.headword} {card.headword} [{pron}] /{' '.join(rng.choice(DEFINITION_WORDS) for _ in range(8))}/\n")
+        for _ in range(extra_entries):
+            length = rng.choice((1, 2, 2, 3))
+            headword = "".join(chr(rng.randint(CJK_FIRST, CJK_LAST)) for _ in range(length))
+            pron = " ".join(rng.choice(syllables) + str(rng.randint(1, 5)) for _ in range(length))
+            f.write(f"{headword} {headword} [{pron}] /{rng.choice(DEFINITION_WORDS)}/variant of {headword[0]}/\n")
@@ -0,0 +1,115 @@
+"""Measures how much the add-on adds to Anki's startup, and how much its first use costs.
+
+Each run imports the add-on in a fresh interpreter, the way Anki loads it on launch, and reports the time spent and
+the modules that the import pulled in. `aqt` and Qt are replaced by stand-ins, and `anki` is used if it is installed.
+All of these are loaded before timing starts, since Anki has always loaded them before it loads any add-on.
+Run it from the add-on directory:
+    python -m benchmarks.startup --runs 20
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+import types
+
+from .addon import ADDON_DIR, ADDON_PACKAGE
+from .fake_collection import FakeCollection, install_stand_in_modules
+
+class StandInType(type):
+    def __getattr__(cls, name: str) -> StandIn:
+        return StandIn()
+
+class StandIn(metaclass=StandInType):
+    """Accepts any construction, call or attribute access, so add-on code written against Qt runs without it."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs) -> StandIn:
+        return StandIn()
+
+    def __getattr__(self, name: str) -> StandIn:
+        return StandIn()
+
+class StandInModule(types.ModuleType):
+    def __getattr__(self, name: str) -> StandIn:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return StandIn
+
+def install_qt_stand_ins():
+    """Registers stand-ins for `aqt` and PyQt6, including a main window with a Tools menu.
+    `from aqt.qt import *` exports every Qt class name that appears in the add-on's source."""
+    qt_names = set()
+    for path in ADDON_DIR.rglob("*.py"):
+        qt_names.update(re.findall(r"\bQ[A-Z]\w*", path.read_text(encoding="utf-8")))
+
+    aqt_qt = StandInModule("aqt.qt")
+    aqt_qt.__all__ = sorted(qt_names)
+    for name in qt_names:
+        setattr(aqt_qt, name, type(name, (StandIn,), {}))
+
+    aqt = StandInModule("aqt")
+    aqt.__path__ = []
+    aqt.mw = StandIn()
+    aqt.qt = aqt_qt
+    pyqt = StandInModule("PyQt6")
+    pyqt.__path__ = []
+    sys.modules.update({"aqt": aqt, "aqt.qt": aqt_qt, "PyQt6": pyqt})
+    for name in ("aqt.utils", "aqt.operations", "PyQt6.QtCore", "PyQt6.QtGui", "PyQt6.QtWidgets"):
+        sys.modules[name] = StandInModule(name)
+
+def import_addon() -> types.ModuleType:
+    """Imports the add-on as a regular package, running its `__init__.py` as Anki does."""
+    spec = importlib.util.spec_from_file_location(
+        ADDON_PACKAGE, ADDON_DIR / "__init__.py", submodule_search_locations=[str(ADDON_DIR)])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[ADDON_PACKAGE] = module
+    spec.loader.exec_module(module)
+    return module
+
+def measure_once() -> dict:
+    """Imports the add-on, then the dialog that its menu action opens, and returns the time and modules of each."""
+    install_stand_in_modules(FakeCollection())
+    install_qt_stand_ins()
+    results = {}
+    for phase, load in (("startup", import_addon), ("first_use", lambda: importlib.import_module(f"{ADDON_PACKAGE}.gui"))):
+        before = set(sys.modules)
+        start = time.perf_counter()
+        load()
+        seconds = time.perf_counter() - start
+        results[phase] = {"seconds": seconds, "modules": sorted(set(sys.modules) - before)}
+    return results
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Measure the add-on's contribution to Anki's startup time.")
+    parser.add_argument("--runs", type=int, default=10, help="The number of fresh interpreters to measure in.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_once()))
+        return
+
+    runs = [
+        json.loads(subprocess.run([sys.executable, "-m", "benchmarks.startup", "--child"], cwd=ADDON_DIR,
+                                  check=True, capture_output=True, text=True).stdout)
+        for _ in range(args.runs)
+    ]
+    for phase in ("startup", "first_use"):
+        median = statistics.median(run[phase]["seconds"] for run in runs)
+        modules = runs[-1][phase]["modules"]
+        addon_modules = [name for name in modules if name.startswith(ADDON_PACKAGE + ".")]
+        print(f"{phase:>9}: {median * 1000:7.1f} ms (median of {len(runs)}), {len(modules)} modules loaded, "
+              f"{len(addon_modules)} of them from the add-on")
+        if addon_modules:
+            print(" " * 11 + ", ".join(name[len(ADDON_PACKAGE) + 1:] for name in addon_modules))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import hashlib
+import html
+import mmap
+import os
+import re
+import struct
+from dataclasses import dataclass
+from os.path import dirname, realpath
+from typing import TYPE_CHECKING, Optional
+
+from .tones import normalise_pinyin
+
+if TYPE_CHECKING:
+    from .pleco_import import CardBatch
+
+CEDICT_INDEX_DIR: str = dirname(realpath(__file__)) + "/user_files/cedict/" # Compiled indexes, one per dictionary file.
+INDEX_VERSION = 1 # Increment whenever the layout or content of compiled indexes changes, so that they are recompiled.
+
+INDEX_MAGIC = b"PLCD"
+HEADER = struct.Struct("<4sIQQI") # Magic, index version, size and modification time (ns) of the dictionary file, number of entries.
+OFFSET = struct.Struct("<I")      # The position of an entry's record within the records section.
+
+# https://cc-cedict.org/wiki/format:syntax
+CEDICT_LINE_RE = re.compile(r"^(\S+) (\S+) \[([^\]]*)\] /(.*)/\s*$")
+VARIANT_RE = re.compile(r"^(?:old |archaic |ancient |Japanese |erroneous )?variant of (.+)$|^also written (.+)$")
+SEPARATORS_RE = re.compile(r"[\t\n\r]")
+
+@dataclass
+class CedictEntry:
+    traditional:    str # The traditional forms of the headword, separated by "/" if there are several.
+    variants:       str # The forms that the dictionary lists as variants of, or alternatives to, the headword.
+    definitions:    str # Every definition in the dictionary for the headword and reading, separated by "; ".
+
+class CedictIndex:
+    """A read-only index of a CC-CEDICT format dictionary, keyed on each simplified headword and normalised pinyin reading.
+
+    The dictionary is compiled once into an index file in CEDICT_INDEX_DIR, which is recompiled when the dictionary
+    file changes. The index holds a table of fixed-size offsets followed by one record per headword and reading,
+    sorted by key. It's memory-mapped rather than loaded, and looked up with a binary search over the offsets,
+    so a lookup reads O(log n) records and only the pages it touches are brought into memory."""
+
+    def __init__(self, index_path: str):
+        with open(index_path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, _, _, _, self.count = HEADER.unpack_from(self.data)
+        self.records_start = HEADER.size + self.count * OFFSET.size
+
+    @classmethod
+    def open(cls, dictionary_file: str) -> CedictIndex:
+        """Opens the index of the given CC-CEDICT file, compiling it first if it hasn't been or the file has changed since."""
+        stat = os.stat(dictionary_file)
+        path_key = hashlib.blake2b(realpath(dictionary_file).encode("utf-8"), digest_size=8).hexdigest()
+        index_path = CEDICT_INDEX_DIR + f"{path_key}.idx"
+        if not index_is_current(index_path, stat):
+            compile_cedict(dictionary_file, index_path, stat)
+        return cls(index_path)
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self) -> CedictIndex:
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def lookup(self, headword: str, pinyin: str) -> Optional[CedictEntry]:
+        """Returns the entry for the given simplified headword and reading, in tone marks or numbers, or None."""
+        key = index_key(headword, normalise_pinyin(pinyin))
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = self.records_start + OFFSET.unpack_from(self.data, HEADER.size + middle * OFFSET.size)[0]
+            key_end = self.data.find(b"\t", self.data.find(b"\t", start) + 1) + 1
+            record_key = self.data[start:key_end]
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                fields = self.data[key_end:self.data.find(b"\n", key_end)].decode("utf-8").split("\t")
+                return CedictEntry(*fields)
+        return None
+
+    def enrich(self, batch: CardBatch):
+        """Fills in the traditional forms, variants and full definitions of the dictionary cards in the batch
+        that are found in the dictionary. Other cards are left as they are."""
+        headwords, prons = batch.column("headword_sc"), batch.column("pron")
+        traditional, variants, definitions = batch.column("headword_tc"), batch.column("variants"), batch.column("full_defn")
+        for i, dict_card in enumerate(batch.dict_type):
+            if not dict_card:
+                continue
+            entry = self.lookup(headwords[i], prons[i])
+            if entry is not None:
+                traditional[i] = html.escape(entry.traditional, quote=False)
+                variants[i] = html.escape(entry.variants, quote=False)
+                definitions[i] = html.escape(entry.definitions, quote=False)
+
+def index_key(headword: str, normalised_pinyin: str) -> bytes:
+    return f"{headword}\t{normalised_pinyin}\t".encode("utf-8")
+
+def index_is_current(index_path: str, stat: os.stat_result) -> bool:
+    """Returns true if the index file exists and was compiled, by this version, from a dictionary of the given size and mtime."""
+    try:
+        with open(index_path, "rb") as f:
+            header = f.read(HEADER.size)
+    except FileNotFoundError:
+        return False
+    if len(header) < HEADER.size:
+        return False
+    magic, version, size, mtime_ns, _ = HEADER.unpack(header)
+    return (magic, version, size, mtime_ns) == (INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns)
+
+def compile_cedict(dictionary_file: str, index_path: str, stat: os.stat_result):
+    """Compiles a CC-CEDICT file into an index file. Entries that share a simplified headword and reading are merged."""
+    # Maps each key to its traditional forms, variants and definitions, each kept in the order they're first seen.
+    entries: dict[bytes, tuple[dict[str, None], dict[str, None], dict[str, None]]] = {}
+    with open(dictionary_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            match = CEDICT_LINE_RE.match(line)
+            if match is None:
+                continue
+            traditional, simplified, pinyin, definitions = match.groups()
+            forms, variants, meanings = entries.setdefault(index_key(simplified, normalise_pinyin(pinyin)), ({}, {}, {}))
+            forms[traditional] = None
+            for definition in definitions.split("/"):
+                definition = SEPARATORS_RE.sub(" ", definition).strip()
+                if not definition:
+                    continue
+                variant = VARIANT_RE.match(definition)
+                if variant is not None:
+                    variants[variant.group(1) or variant.group(2)] = None
+                else:
+                    meanings[definition] = None
+
+    records: list[bytes] = []
+    offsets: list[bytes] = []
+    position = 0
+    for key in sorted(entries):
+        forms, variants, meanings = entries[key]
+        record = key + "\t".join(("/".join(forms), "; ".join(variants), "; ".join(meanings))).encode("utf-8") + b"\n"
+        offsets.append(OFFSET.pack(position))
+        records.append(record)
+        position += len(record)
+
+    os.makedirs(dirname(index_path), exist_ok=True)
+    # Write to a temporary file first so that a half-written index is never opened.
+    temp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns, len(records)))
+        f.write(b"".join(offsets))
+        f.write(b"".join(records))
+    os.replace(temp_path, index_path)
@@ -0,0 +1,47 @@
+"""Imports Pleco exports into an Anki collection file without the desktop app.
+
+Run from the directory that contains the add-on's folder, e.g.:
+    python -m pleco_anki.cli ~/collection.anki2 flash.xml more.txt exports/ --deck "Chinese::Pleco" --overwrite
+"""
+import argparse
+import sys
+
+from anki.collection import Collection
+
+from .audio import AUDIO_ENGINES
+from .importer import IMPORT_DONE, ImportConfig, import_pleco_files, plan_imports
+from .profiling import profile_import, profiled_config
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import Pleco flashcard exports into an Anki collection.")
+    parser.add_argument("collection", help="Path to the .anki2 collection file. It must not be open in Anki.")
+    parser.add_argument("files", nargs="+", help="Pleco .xml or .txt exports, or folders of them, to import.")
+    parser.add_argument("--deck", required=True, help="The deck to import into. It is created if it doesn't exist.")
+    parser.add_argument("--sub-decks", action="store_true", help="Import each export into a sub-deck of --deck named after it.")
+    parser.add_argument("--overwrite", action="store_true", help="Overwrite notes whose headword and reading already exist in the deck.")
+    parser.add_argument("--set-new", action="store_true", help="Reset the scheduling of overwritten notes. Requires --overwrite.")
+    parser.add_argument("--reverse", action="store_true", help="Also generate reverse cards.")
+    parser.add_argument("--profile", action="store_true", help="Profile each import's CPU and memory use into the add-on's user_files.")
+    parser.add_argument("--audio", metavar="ENGINE", choices=sorted(AUDIO_ENGINES), help="Generate audio for each headword with the named engine.")
+    parser.add_argument("--no-parse-cache", action="store_true", help="Parse every export, even if its parse is cached.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what the import would change, without writing anything.")
+    parser.add_argument("--cedict", default="", help="A CC-CEDICT file to fill in the full definitions, variants and traditional forms of dictionary cards.")
+    parser.add_argument("--workers", type=int, default=1, help="The number of processes used to parse the exports, or 0 to pick one from their size.")
+    args = parser.parse_args(argv)
+
+    config = ImportConfig(args.overwrite, args.set_new and args.overwrite, args.reverse, args.workers, bool(args.audio),
+                          audio_engine=args.audio or "", parse_cache=not args.no_parse_cache, dry_run=args.dry_run, cedict_file=args.cedict)
+    imports = plan_imports(args.files, args.deck, args.sub_decks)
+    col = Collection(args.collection)
+    try:
+        if args.profile:
+            report = profile_import(lambda progress: import_pleco_files(imports, profiled_config(config), progress, col))
+        else:
+            report = import_pleco_files(imports, config, col=col)
+        print(report.summary())
+    finally:
+        col.close()
+    return 0 if report.status == IMPORT_DONE else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+from functools import partial
+from os.path import dirname
+from pathlib import Path
+
+from aqt import mw  # import the main window object (mw) from aqt
+from aqt.operations import QueryOp
+from aqt.qt import *  # import all of the Qt GUI library
+from aqt.utils import showInfo, showWarning  # import the "show info" tool from utils.py
+
+from .audio import AUDIO_ENGINES
+from .import_report import ImportReport
+from .importer import IMPORT_CANCELLED, ImportConfig, import_pleco_files, plan_imports
+from .ui.import_ui import Ui_Dialog
+
+ID_YES = 1
+ID_NO = 0
+
+PATH_SEPARATOR = "; " # Separates the selected files and folders in the file box.
+
+tr = partial(QCoreApplication.translate, "Dialog")
+
+class ImportDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.dialog = Ui_Dialog()
+        self.dialog.setupUi(self)
+        self.connect_signals()
+
+        # Holds the last directory that the user opened when browsing for the Pleco XML file.
+        self.last_dir = str(Path.home())
+
+        self.dialog.group_reverse_buttons.setId(self.dialog.reverse_yes, ID_YES)
+        self.dialog.group_reverse_buttons.setId(self.dialog.reverse_no, ID_NO)
+        self.dialog.group_audio_buttons.setId(self.dialog.audio_yes, ID_YES)
+        self.dialog.group_audio_buttons.setId(self.dialog.audio_no, ID_NO)
+
+        # Populate the decks menu with options of decks to import to.
+        decks = [deck.name for deck in mw.col.decks.all_names_and_ids()]
+        self.dialog.select_deck.addItems(decks)
+
+        self.add_preview_widgets()
+        self.add_batch_widgets()
+        self.setup_audio_option()
+
+    def add_preview_widgets(self):
+        """Adds a "Preview" button beside "Import", and a table below the options that shows what the import would do.
+        They are added here rather than in the .ui file, which is generated."""
+        self.button_preview = QPushButton(tr("Preview"), parent=self)
+        self.button_preview.setToolTip(tr("Compare the export with the deck without changing anything."))
+        self.dialog.layout_button.addWidget(self.button_preview, 0, 1, 1, 1)
+        self.dialog.layout_button.addWidget(self.dialog.button_import, 0, 2, 1, 1)
+        self.button_preview.clicked.connect(self.perform_preview)
+
+        self.table_preview = QTableWidget(0, 1, parent=self)
+        self.table_preview.setHorizontalHeaderLabels([tr("Notes")])
+        self.table_preview.horizontalHeader().setStretchLastSection(True)
+        self.table_preview.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table_preview.hide()
+        self.dialog.gridLayout_2.addWidget(self.table_preview, 4, 0, 1, 1)
+    
+    def add_batch_widgets(self):
+        """Adds a button to import a whole folder of exports, and an option to import each export into its own sub-deck."""
+        self.button_folder = QPushButton(tr("Folder..."), parent=self)
+        self.dialog.layout_options.addWidget(self.button_folder, 0, 3, 1, 1)
+        self.button_folder.clicked.connect(self.select_folder)
+
+        self.checkbox_sub_decks = QCheckBox(tr("Import each file into its own sub-deck"), parent=self)
+        self.checkbox_sub_decks.setToolTip(tr("Sub-decks are named after each file, and the folders it's in."))
+        self.dialog.layout_options.addWidget(self.checkbox_sub_decks, 4, 0, 1, 3)
+
+    def setup_audio_option(self):
+        """Only offers audio if an engine is selected in the add-on's config, as there is no engine that fits every user."""
+        self.audio_engine = mw.addonManager.getConfig(__name__).get("audio_engine", "")
+        if self.audio_engine not in AUDIO_ENGINES:
+            self.dialog.audio_no.setChecked(True)
+            self.dialog.audio_yes.setEnabled(False)
+            self.dialog.audio_yes.setToolTip(tr("Set \"audio_engine\" in the add-on's config to generate audio."))
+
+    def connect_signals(self):
+        self.dialog.button_file.clicked.connect(self.select_file)       # Connect the file button to the file browser.
+        self.dialog.button_import.clicked.connect(self.perform_import)  # Connect the import button to the import oprtation.
+        self.dialog.button_cancel.clicked.connect(lambda: self.close()) # Close the plugin UI when "Cancel" is clicked.
+
+    def select_file(self):
+        tr = partial(QCoreApplication.translate, "Dialog")
+        
+        selected_files, _ = QFileDialog.getOpenFileNames(self, 
+                                                        tr("Open the exported Pleco decks"), 
+                                                        self.last_dir, 
+                                                        tr("Pleco export files (*.txt *.xml)"))
+        if selected_files:
+            self.last_dir = dirname(selected_files[0]) # Update the last directory that the user looked in.
+            self.dialog.line_file.setText(PATH_SEPARATOR.join(selected_files))
+
+    def select_folder(self):
+        selected_dir = QFileDialog.getExistingDirectory(self, tr("Open a folder of exported Pleco decks"), self.last_dir)
+        if selected_dir:
+            self.last_dir = selected_dir
+            self.dialog.line_file.setText(selected_dir)
+    
+    def import_config(self, dry_run: bool = False) -> ImportConfig:
+        addon_config = mw.addonManager.getConfig(__name__)
+        return ImportConfig(
+            self.dialog.checkbox_overwrite.isChecked(),
+            self.dialog.checkbox_new.isChecked(),
+            self.dialog.group_reverse_buttons.checkedId() == ID_YES,
+            parse_workers=addon_config.get("parse_workers", 1),
+            audio=self.audio_engine in AUDIO_ENGINES and self.dialog.group_audio_buttons.checkedId() == ID_YES,
+            audio_engine=self.audio_engine,
+            dry_run=dry_run,
+            cedict_file=addon_config.get("cedict_file", ""),
+        )
+
+    def perform_import(self):
+        self.run_in_background(self.import_config(), self.dialog.button_import, tr("Importing..."))
+
+    def perform_preview(self):
+        self.run_in_background(self.import_config(dry_run=True), self.button_preview, tr("Previewing..."))
+
+    def run_in_background(self, config: ImportConfig, button: QPushButton, busy_text: str):
+        paths = [path for path in self.dialog.line_file.text().split(PATH_SEPARATOR) if path]
+        imports = plan_imports(paths, self.dialog.select_deck.currentText(), self.checkbox_sub_decks.isChecked())
+
+        # If enabled in the add-on's config, the import is profiled for CPU and memory use.
+        profile = not config.dry_run and mw.addonManager.getConfig(__name__).get("profile_imports")
+        if profile:
+            from .profiling import profile_import, profiled_config
+            config = profiled_config(config)
+
+        def run_import(progress) -> ImportReport:
+            return import_pleco_files(imports, config, progress)
+
+        # Set the import operation to run in the background. 
+        if profile:
+            op_func = lambda _: profile_import(run_import, self.report_progress)
+        else:
+            op_func = lambda _: run_import(self.report_progress)
+        op = QueryOp(
+            parent=mw,
+            op=op_func,
+            success=self.import_success,   
+        ).failure(self.import_failed)
+
+        # Style the button that started the operation, and stop another one starting until it finishes.
+        self.idle_text = button.text()
+        self.busy_button = button
+        self.cards_done = 0 # The number of cards processed, as of the last batch written.
+        button.setText(busy_text)
+        self.dialog.button_import.setEnabled(False)
+        self.button_preview.setEnabled(False)
+        # Run the import operation.
+        op.with_progress().run_in_background()
+
+    def report_progress(self, cards_done: int, cards_total: int) -> bool:
+        """Shows the number of cards imported so far. Called from the import's background thread after each batch.
+        Returns false if the user has asked to cancel the import."""
+        self.cards_done = cards_done
+        label = tr("Imported {} of {} cards").format(cards_done, cards_total)
+        mw.taskman.run_on_main(lambda: mw.progress.update(label=label, value=cards_done, max=cards_total))
+        return not mw.progress.want_cancel()
+
+    def finish_operation(self):
+        """Restores the buttons that were disabled while the import or preview ran."""
+        self.busy_button.setText(self.idle_text)
+        self.dialog.button_import.setEnabled(True)
+        self.button_preview.setEnabled(True)
+
+    def import_success(self, report: ImportReport):
+        self.finish_operation()
+        if report.dry_run:
+            self.show_preview(report)
+            return
+
+        summary = report.summary()
+        if report.status == IMPORT_CANCELLED:
+            summary = tr("Import cancelled. Cards imported before cancelling have been kept.") + "\n\n" + summary
+        showInfo(summary, parent=self, title=tr("Pleco import"))
+
+    def import_failed(self, error: Exception):
+        previewing = self.busy_button is self.button_preview
+        self.finish_operation()
+        if previewing:
+            showWarning(tr("The preview failed: {}").format(error), parent=self, title=tr("Pleco import"))
+            return
+        showWarning(
+            tr("The import failed: {}").format(error) + "\n\n" 
+            + tr("The first {} cards were imported before the error, and have been kept.").format(self.cards_done),
+            parent=self, title=tr("Pleco import"))
+
+    def show_preview(self, report: ImportReport):
+        """Fills the preview table with the counts of a dry run."""
+        rows = [
+            (tr("Cards in the export"), report.cards_parsed),
+            (tr("New notes"), report.notes_added),
+            (tr("Overwritten notes"), report.notes_updated),
+            (tr("Identical notes"), report.notes_identical),
+            (tr("Ignored duplicates"), report.notes_skipped - report.notes_identical),
+            (tr("Unreadable lines"), report.lines_malformed),
+        ]
+        rows += [(tr("Changed field: {}").format(name), count) for name, count in report.field_changes.items()]
+
+        self.table_preview.setRowCount(len(rows))
+        self.table_preview.setVerticalHeaderLabels([label for label, _ in rows])
+        for row, (_, count) in enumerate(rows):
+            self.table_preview.setItem(row, 0, QTableWidgetItem(str(count)))
+        self.table_preview.show()
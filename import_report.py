@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from os.path import dirname, realpath
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Optional, TypeVar
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+
+LOG_FILE: str = dirname(realpath(__file__)) + "/user_files/import_log.jsonl" # One JSON report per line, appended after every import.
+MALFORMED_LINES_KEPT = 100 # The number of malformed lines whose location is kept in a report. All of them are counted.
+
+T = TypeVar("T")
+
+@dataclass
+class ImportReport:
+    """Wall time per stage and counters for a single run of import_pleco.
+    
+    The "query" and "write" stages hold the time spent in collection calls. That time is also part of whichever
+    of the other stages ("setup", "notes", "index", "reschedule") issued the call."""
+    file:               str
+    deck:               str
+    status:             int = 0
+    cards_parsed:       int = 0 # Cards read from the export, of any type.
+    dupes_found:        int = 0 # Existing notes whose headword and reading matched an imported card.
+    notes_added:        int = 0
+    notes_updated:      int = 0
+    notes_skipped:      int = 0 # Cards that didn't reach the collection: unchanged since the last import or ignored duplicates.
+    cards_rescheduled:  int = 0
+    queries:            int = 0 # Searches and reads issued against the collection.
+    writes:             int = 0 # Write operations issued against the collection.
+    stage_seconds:      dict[str, float] = field(default_factory=dict)
+    timestamp:          float = field(default_factory=time.time)
+    profile_path:       str = "" # The folder holding the CPU and memory profiles, if the import was profiled.
+    dry_run:            bool = False # The import was only previewed. The note counters hold what the import would have done.
+    notes_identical:    int = 0 # Existing notes that already hold exactly what the card would write. Only counted by dry runs.
+    field_changes:      dict[str, int] = field(default_factory=dict) # The number of duplicate notes that differ from the card in each field. Only counted by dry runs.
+    lines_malformed:    int = 0 # Lines of .txt exports that couldn't be parsed as cards, and were skipped.
+    malformed_lines:    list[str] = field(default_factory=list) # "file:line" for the first MALFORMED_LINES_KEPT of them.
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Adds the wall time spent in the with-block to the named stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float):
+        self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+
+    def timed_stream(self, name: str, stream: Iterable[T]) -> Iterator[T]:
+        """Yields the items of the stream, adding the time spent producing each of them to the named stage."""
+        iterator = iter(stream)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - start)
+                return
+            self.add_time(name, time.perf_counter() - start)
+            yield item
+
+    def add_malformed_line(self, filename: str, line_number: int, line: str):
+        """Records a line of a .txt export that couldn't be parsed as a card. Called from the parser's thread."""
+        self.lines_malformed += 1
+        if len(self.malformed_lines) < MALFORMED_LINES_KEPT:
+            self.malformed_lines.append(f"{filename}:{line_number}")
+
+    def summary(self) -> str:
+        """Returns a short, human-readable summary of the import."""
+        if self.dry_run:
+            changes = ", ".join(f"{name} {count}" for name, count in self.field_changes.items()) or "none"
+            return (
+                f"{self.cards_parsed} cards read: {self.notes_added} notes would be added, {self.notes_updated} overwritten, "
+                f"{self.notes_identical} are identical and {self.notes_skipped - self.notes_identical} duplicates ignored.\n"
+                f"Fields changed: {changes}.\n"
+                f"Previewed in {self.stage_seconds.get('total', 0.0):.2f}s using {self.queries} collection queries."
+                + self.malformed_summary()
+            )
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.stage_seconds.items())
+        return (
+            f"{self.cards_parsed} cards read: {self.notes_added} notes added, {self.notes_updated} updated, "
+            f"{self.notes_skipped} skipped, {self.cards_rescheduled} cards rescheduled.\n"
+            f"{self.dupes_found} duplicates found using {self.queries} collection queries and {self.writes} writes.\n"
+            f"Time: {stages}."
+            + self.malformed_summary()
+            + (f"\nProfiles saved to: {self.profile_path}" if self.profile_path else "")
+        )
+
+    def malformed_summary(self) -> str:
+        if not self.lines_malformed:
+            return ""
+        shown = ", ".join(self.malformed_lines[:5]) + (", ..." if self.lines_malformed > 5 else "")
+        return f"\n{self.lines_malformed} lines couldn't be read as cards and were skipped: {shown}"
+
+    def write_log(self, filename: Optional[str] = None):
+        """Appends the report to the add-on's import log, or the given file, as a single JSON line."""
+        filename = filename or LOG_FILE
+        os.makedirs(dirname(filename), exist_ok=True)
+        with open(filename, "a", encoding="utf-8") as f:
+            f.write(json.dumps(asdict(self), ensure_ascii=False) + "\n")
+
+class InstrumentedCollection:
+    """Wraps a collection to count, and time, the queries and writes that the import makes through it.
+    Time spent in queries is added to the report's "query" stage and time spent in writes to its "write" stage."""
+
+    QUERY_METHODS = ("find_notes", "find_cards", "get_note")
+    WRITE_METHODS = ("add_notes", "update_notes")
+
+    def __init__(self, col: Collection, report: ImportReport):
+        self._col = col
+        self._report = report
+        self.db = _InstrumentedDB(col.db, report)
+        self.sched = _InstrumentedScheduler(col.sched, report)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._col, name)
+        if name in self.QUERY_METHODS:
+            return _counted(attr, self._report, "queries", "query")
+        if name in self.WRITE_METHODS:
+            return _counted(attr, self._report, "writes", "write")
+        return attr
+
+class _InstrumentedDB:
+    def __init__(self, db: Any, report: ImportReport):
+        self._db = db
+        self.all = _counted(db.all, report, "queries", "query")
+        self.list = _counted(db.list, report, "queries", "query")
+        self.scalar = _counted(db.scalar, report, "queries", "query")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._db, name)
+
+class _InstrumentedScheduler:
+    def __init__(self, sched: Any, report: ImportReport):
+        self._sched = sched
+        self.schedule_cards_as_new = _counted(sched.schedule_cards_as_new, report, "writes", "write")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._sched, name)
+
+def _counted(method: Callable, report: ImportReport, counter: str, stage: str) -> Callable:
+    def wrapper(*args, **kwargs):
+        setattr(report, counter, getattr(report, counter) + 1)
+        with report.stage(stage):
+            return method(*args, **kwargs)
+    return wrapper
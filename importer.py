@@ -0,0 +1,427 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from contextlib import closing, nullcontext
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+from os.path import dirname, realpath
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Mapping, Optional, TypeVar, Union
+
+from .anki_manip import (AnkiDeck, AnkiNotes, CardTemplates, deck_notes, find_legacy_key, legacy_key_index, main_collection, 
+                         note_key, reset_cards)
+from .audio import AUDIO_ENGINES, AudioStage
+from .cedict import CedictIndex
+from .import_report import ImportReport, InstrumentedCollection
+from .note_index import ContentIndex, note_mods
+from .parse_cache import ParseCache, export_key
+from .pleco_import import NOTE_FIELDS, CardBatch, count_pleco_cards, parse_pleco_files, pleco_exports_in, rebatch
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+    from anki.notes import NoteId
+
+TEMPLATE_DIR: str       = dirname(realpath(__file__)) + "/templates/" # The directory path to the template files.
+NOTE_TEMPLATE_FILES     = (TEMPLATE_DIR + "front.html", TEMPLATE_DIR + "back.html")
+REVERSE_TEMPLATE_FILES  = (TEMPLATE_DIR + "front_reverse.html", TEMPLATE_DIR + "back_reverse.html")
+
+NOTE_TYPE_NAME = "CustomPleco" # The NoteType shared by custom and dictionary flashcards.
+IMPORT_BATCH_SIZE = 500 # The number of flashcards written to the collection at a time.
+PIPELINE_DEPTH = 4 # The number of parsed batches that may wait to be written. Caps the memory held by parsed cards.
+
+IMPORT_DONE = 0
+IMPORT_CANCELLED = 1
+IMPORT_FAILED = 2 # Only ever logged: the error is re-raised to the caller.
+
+T = TypeVar("T")
+
+@dataclass
+class ImportConfig:
+    overwrite: bool
+    set_new: bool
+    reverse: Union[str, bool] = False
+    parse_workers: int = 1 # The number of processes used to parse the exports. 1 parses them serially, 0 picks a number from their size.
+    audio: bool = False # Generate audio for each headword.
+    audio_engine: str = "" # The name of the engine in AUDIO_ENGINES that generates the audio. Must be set if `audio` is.
+    voice: str = "default"
+    parse_cache: bool = True # Reuse the cards parsed from an export when it's imported again unchanged.
+    pipeline_depth: int = PIPELINE_DEPTH # Batches parsed ahead of the writes, on a separate thread. 0 parses on the calling thread.
+    dry_run: bool = False # Only compare the cards against the deck and report what the import would do, without writing anything.
+    cedict_file: str = "" # A CC-CEDICT format dictionary that fills in the traditional forms, variants and full definitions of dictionary cards.
+
+    def __post_init__(self):
+        self.reverse = "y" if self.reverse else ""
+
+@lru_cache(maxsize=None)
+def custom_templates() -> CardTemplates:
+    """Returns the card templates for the custom flashcard NoteType. They are read from disk once and reused across imports."""
+    return CardTemplates([NOTE_TEMPLATE_FILES, REVERSE_TEMPLATE_FILES], TEMPLATE_DIR + "card.css")
+
+def import_pleco(xml_file: str, deck_name: str, config: ImportConfig, progress: Optional[Callable[[int, int], bool]] = None, 
+                 col: Optional[Collection] = None) -> ImportReport:
+    """Imports the cards of a Pleco export into the named deck. See import_pleco_files."""
+    return import_pleco_files({xml_file: deck_name}, config, progress, col)
+
+def plan_imports(paths: Iterable[str], deck_name: str, sub_decks: bool = False) -> dict[str, str]:
+    """Maps each Pleco export in the given paths, which may be exports or directories of exports, to the deck it's imported into.
+
+    :param sub_decks: If true, each export is imported into a sub-deck of the named deck that is named after the export. 
+                      Exports found in a directory are nested further by the folders between them and that directory.
+                      Otherwise, every export is imported into the named deck."""
+    imports: dict[str, str] = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in pleco_exports_in(path):
+                parts = Path(filename).relative_to(path).with_suffix("").parts
+                imports[filename] = "::".join((deck_name, *parts)) if sub_decks else deck_name
+        else:
+            imports[path] = f"{deck_name}::{Path(path).stem}" if sub_decks else deck_name
+    return imports
+
+def file_batches(filenames: Iterable[str], workers: int = 1, cache: Optional[ParseCache] = None, 
+                 on_malformed: Optional[Callable[[str, int, str], None]] = None) -> Iterator[tuple[str, CardBatch]]:
+    """Yields the cards of each export in batches of IMPORT_BATCH_SIZE cards, paired with the export's filename.
+    A batch never holds the cards of more than one export.
+
+    :param cache: If given, exports whose parse is cached are loaded from it instead of being parsed, and the
+                  other exports are added to it batch by batch, once all of their cards have been consumed. 
+                  Malformed lines of cached .txt exports aren't reported again.
+    :param on_malformed: Called with the filename, line number and content of each unrecognised line of a .txt export.
+                         By default they are reported with print."""
+    filenames = list(filenames)
+    keys = {filename: export_key(filename) for filename in filenames} if cache is not None else {}
+    cached = {filename for filename, key in keys.items() if cache.has(key)}
+
+    # The exports that aren't cached are parsed together, so that they share the parser processes.
+    parsed = groupby(parse_pleco_files([f for f in filenames if f not in cached], on_malformed, workers), key=itemgetter(0))
+    next_parsed = next(parsed, None)
+    for filename in filenames:
+        writer = None # Caches the export's cards as they're parsed.
+        if filename in cached:
+            batches: Iterable[CardBatch] = cached_batches(cache, keys[filename], filename, workers, on_malformed)
+        else:
+            writer = cache.writer(keys[filename]) if cache is not None else None
+            if next_parsed is not None and next_parsed[0] == filename:
+                batches = (batch for _, batch in next_parsed[1])
+                next_parsed = None
+            else:
+                batches = [] # The export has no cards.
+
+        try:
+            for batch in rebatch(batches, IMPORT_BATCH_SIZE):
+                if writer is not None:
+                    writer.write(batch)
+                yield filename, batch
+        except BaseException:
+            # The export's cards weren't all consumed, so its parse isn't cached.
+            if writer is not None:
+                writer.discard()
+            raise
+        if writer is not None:
+            writer.commit()
+        if next_parsed is None:
+            next_parsed = next(parsed, None)
+    # Evict only once every export has been read, so that no cached parse is evicted before it's loaded.
+    if cache is not None:
+        cache.evict()
+
+def cached_batches(cache: ParseCache, key: str, filename: str, workers: int = 1, 
+                   on_malformed: Optional[Callable[[str, int, str], None]] = None) -> Iterator[CardBatch]:
+    """Yields the cached cards of an export. If the cache file turns out to be unreadable, the export is parsed
+    instead, from the first card that wasn't loaded from the cache, so that a bad cache never fails an import."""
+    loaded = 0 # The number of cards already loaded from the cache.
+    try:
+        for batch in cache.load(key):
+            loaded += len(batch)
+            yield batch
+        return
+    except ValueError as error:
+        print(f"{error} Parsing {filename} instead.")
+
+    # The parsers produce the same cards, in the same order, as were cached.
+    for _, batch in parse_pleco_files([filename], on_malformed, workers):
+        if loaded >= len(batch):
+            loaded -= len(batch)
+            continue
+        yield batch.slice(loaded, len(batch)) if loaded else batch
+        loaded = 0
+
+def import_pleco_files(imports: Mapping[str, str], config: ImportConfig, progress: Optional[Callable[[int, int], bool]] = None, 
+                       col: Optional[Collection] = None) -> ImportReport:
+    """Imports the cards of several Pleco exports, each into its own deck, in batches of IMPORT_BATCH_SIZE cards.
+    The exports share a single NoteType setup, and the cards of every duplicate note are rescheduled together at the end,
+    so importing many exports costs about the same as importing one export of the same total size.
+    
+    :param imports: Maps the filename of each export to the name of the deck it's imported into. Exports are imported 
+                    in this order, and decks that don't exist yet are created.
+    :param progress: Called after each batch with the number of cards processed so far and the total number of cards
+                     in the files. If it returns false, the import stops cleanly at that batch boundary; 
+                     the batches already written are kept.
+    :param col: The collection to import into. Defaults to the collection open in Anki's main window.
+
+    :return A report of the time spent in each stage and the number of cards and notes handled. Its status is 
+            IMPORT_DONE, or IMPORT_CANCELLED if the import was stopped through `progress`. The report is also 
+            appended to the add-on's import log, unless `config.dry_run` is set, in which case nothing is written
+            and the report holds what the import would have done. If the import raises, the batches already
+            written are kept, and the report is logged with the status IMPORT_FAILED before the error propagates.
+    """
+    if config.audio and config.audio_engine not in AUDIO_ENGINES:
+        raise ValueError(f"Audio needs one of these engines: {', '.join(AUDIO_ENGINES)}. Got: {config.audio_engine!r}.")
+    for xml_file, deck_name in imports.items():
+        print("Importing deck from: " + xml_file + " -> to deck: " + deck_name )
+    report = ImportReport(", ".join(imports), ", ".join(dict.fromkeys(imports.values())), IMPORT_DONE, dry_run=config.dry_run)
+    col = InstrumentedCollection(col if col is not None else main_collection(), report)
+    import_start = time.perf_counter()
+
+    # Stream the Pleco files as batches of IMPORT_BATCH_SIZE cards. The files are parsed on a separate thread
+    # while earlier batches are written, at most config.pipeline_depth batches ahead of the writes.
+    # If a dictionary is configured, its entries are filled into the dictionary cards on that thread too.
+    cache = ParseCache() if config.parse_cache else None
+    with report.stage("setup"):
+        dictionary = CedictIndex.open(config.cedict_file) if config.cedict_file else None
+    batches = report.timed_stream("parse", file_batches(imports, config.parse_workers, cache, report.add_malformed_line))
+    if dictionary is not None:
+        batches = enriched(batches, dictionary, report)
+    flashcards = pipelined(batches, config.pipeline_depth)
+    cards_total = sum(count_pleco_cards(xml_file) for xml_file in imports) if progress is not None else 0
+
+    try:
+        # The dictionary is closed last, as the parser thread may be enriching a batch until the stream is closed.
+        with dictionary if dictionary is not None else nullcontext(), closing(flashcards):
+            if config.dry_run:
+                diff_pleco(flashcards, imports, config, report, col, progress, cards_total)
+            else:
+                write_pleco(flashcards, imports, config, report, col, progress, cards_total)
+    except BaseException:
+        report.status = IMPORT_FAILED
+        raise
+    finally:
+        report.add_time("total", time.perf_counter() - import_start)
+        if not config.dry_run:
+            report.write_log()
+    return report
+
+def enriched(flashcards: Iterable[tuple[str, CardBatch]], dictionary: CedictIndex, report: ImportReport) -> Iterator[tuple[str, CardBatch]]:
+    """Yields each batch of flashcards once its dictionary cards have been filled in from the dictionary."""
+    for xml_file, batch in flashcards:
+        with report.stage("enrich"):
+            dictionary.enrich(batch)
+        yield xml_file, batch
+
+def pipelined(stream: Iterable[T], depth: int) -> Iterator[T]:
+    """Yields the items of the stream, producing them on a separate thread up to `depth` items ahead of the consumer.
+    If `depth` is 0, the items are produced on the consumer's thread instead.
+
+    An exception raised while producing an item is re-raised here, once the items produced before it are consumed.
+    If the consumer stops early, by closing this generator or raising, the producer stops before its next item."""
+    if depth <= 0:
+        yield from stream
+        return
+
+    items: queue.Queue[tuple[Any, Optional[BaseException]]] = queue.Queue(depth)
+    stop = threading.Event()
+    end = object() # Marks the end of the stream.
+
+    def put(entry: tuple[Any, Optional[BaseException]]) -> bool:
+        # Waits for space in the queue, giving up if the consumer has stopped.
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        iterator = iter(stream)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except BaseException as error:
+            put((end, error))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, name="pleco-import-parser", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+def write_pleco(flashcards: Iterable[tuple[str, CardBatch]], imports: Mapping[str, str], config: ImportConfig, report: ImportReport, 
+                col: Collection, progress: Optional[Callable[[int, int], bool]] = None, cards_total: int = 0):
+    """Writes the flashcards of each export to its deck, creating and updating notes as set by the config,
+    and fills the report's counters with what was written.
+
+    `progress` is called as by import_pleco_files, every IMPORT_BATCH_SIZE cards."""
+    notes_custom: Optional[AnkiNotes] = None   # Note handler for both custom and dictionary flashcards.
+    # Open / create the selected decks.
+    with report.stage("setup"):
+        decks = {deck_name: AnkiDeck(deck_name, col) for deck_name in dict.fromkeys(imports.values())}
+    content_indexes: dict[str, ContentIndex] = {} # Fingerprints of the content last imported into each deck, by deck name.
+    mods: Optional[dict[NoteId, int]] = None      # Note modification times, read once to load every deck's index.
+    audio_stage = AudioStage(col, AUDIO_ENGINES[config.audio_engine](), config.voice) if config.audio else None
+    reset_note_ids: dict[str, set[NoteId]] = {}   # Duplicate notes whose cards are set as new after the import, by deck name.
+    # Process all flashcards, writing them to the collection in fixed-size batches.
+    for xml_file, batch in flashcards:
+        report.cards_parsed += len(batch)
+        deck_name = imports[xml_file]
+        deck = decks[deck_name]
+        # Load the NoteType interface once the first cards arrive. Dictionary cards have their markup converted 
+        # to HTML while parsing, so they share the custom cards' NoteType.
+        if notes_custom is None:
+            with report.stage("setup"):
+                notes_custom = AnkiNotes(NOTE_TYPE_NAME, list(NOTE_FIELDS), custom_templates(), col)
+        if deck_name not in content_indexes:
+            with report.stage("setup"):
+                if mods is None:
+                    mods = note_mods(col, notes_custom.id)
+                content_indexes[deck_name] = ContentIndex(deck.id, notes_custom, mods)
+        content_index = content_indexes[deck_name]
+
+        # Generate a reverse card if the config specifies.
+        if config.reverse:
+            batch.set_column("reverse", ["y"] * len(batch))
+        if audio_stage is not None:
+            audio_stage.set_audio_fields(batch)
+
+        # Cards that are identical to what was last imported are skipped without touching the collection.
+        # Their notes are still duplicates, so they are rescheduled along with the others if the config specifies.
+        with report.stage("index"):
+            rows = []
+            for row in batch.rows():
+                if not content_index.is_unchanged(row):
+                    rows.append(row)
+                elif config.overwrite and config.set_new:
+                    reset_note_ids.setdefault(deck_name, set()).update(content_index.note_ids(row))
+        report.notes_skipped += len(batch) - len(rows)
+        if rows:
+            if audio_stage is not None:
+                with report.stage("audio"):
+                    audio_stage.generate((row[0], row[1]) for row in rows)
+
+            # Create a note for each changed flashcard in the batch and add them to the deck.
+            with report.stage("notes"):
+                notes_by_card = notes_custom.create_notes_by_card(deck.id, rows, config.overwrite)
+            for row, card_notes in zip(rows, notes_by_card):
+                content_index.record(row, card_notes)
+                if not card_notes:
+                    # The card's headword and reading already exist, but aren't being overwritten.
+                    report.dupes_found += 1
+                    report.notes_skipped += 1
+                for _, dupe in card_notes:
+                    if dupe:
+                        report.dupes_found += 1
+                        report.notes_updated += 1
+                    else:
+                        report.notes_added += 1
+
+            if config.set_new:
+                # Collect the duplicate notes whose cards are rescheduled once the whole import is written.
+                reset_note_ids.setdefault(deck_name, set()).update(
+                    note_id for card_notes in notes_by_card for note_id, dupe in card_notes if dupe)
+
+        # Report progress, and stop between batches if the import has been cancelled.
+        if progress is not None and not progress(report.cards_parsed, max(cards_total, report.cards_parsed)):
+            report.status = IMPORT_CANCELLED
+            break
+
+    if audio_stage is not None:
+        with report.stage("audio"):
+            audio_stage.flush()
+    with report.stage("index"):
+        mods = note_mods(col, notes_custom.id) if any(index.pending for index in content_indexes.values()) else None
+        for content_index in content_indexes.values():
+            content_index.save(mods)
+    # Reset the scheduling of the cards of all duplicate notes, in every deck, with a single scheduler call.
+    if reset_note_ids:
+        with report.stage("reschedule"):
+            reset_card_ids = [card_id for deck_name, note_ids in reset_note_ids.items() 
+                              for card_id in decks[deck_name].cards_for_notes(note_ids)]
+            reset_cards(col, reset_card_ids)
+        report.cards_rescheduled = len(reset_card_ids)
+
+def diff_pleco(flashcards: Iterable[tuple[str, CardBatch]], imports: Mapping[str, str], config: ImportConfig, report: ImportReport, 
+               col: Collection, progress: Optional[Callable[[int, int], bool]] = None, cards_total: int = 0):
+    """Compares the flashcards of each export against the notes in its deck and fills the report's counters with what
+    importing them would do, without writing to the collection. Each deck's notes are read with a single query
+    and indexed on their note_key() in memory, so each card is diffed with a dictionary lookup.
+
+    `progress` is called as by import_pleco_files, every IMPORT_BATCH_SIZE cards."""
+    with report.stage("setup"):
+        model = col.models.by_name(NOTE_TYPE_NAME)
+        model_fields = col.models.field_names(model) if model is not None else []
+    audio_stage = AudioStage(col, AUDIO_ENGINES[config.audio_engine](), config.voice) if config.audio else None
+    # Maps each deck name to its index of note keys to the fields, by name, of the notes that hold them.
+    deck_indexes: dict[str, dict[str, list[dict[str, str]]]] = {}
+    legacy_keys: dict[str, dict[str, list[str]]] = {} # Each deck's existing note keys by headword, for find_legacy_key().
+
+    for xml_file, batch in flashcards:
+        report.cards_parsed += len(batch)
+        deck_name = imports[xml_file]
+        if deck_name not in deck_indexes:
+            with report.stage("setup"):
+                existing = deck_indexes[deck_name] = {}
+                deck_id = col.decks.id_for_name(deck_name)
+                if model is not None and deck_id:
+                    for _, values in deck_notes(col, model["id"], deck_id):
+                        existing.setdefault(note_key(values), []).append(dict(zip(model_fields, values)))
+                legacy_keys[deck_name] = legacy_key_index(existing)
+        existing = deck_indexes[deck_name]
+
+        if config.reverse:
+            batch.set_column("reverse", ["y"] * len(batch))
+        if audio_stage is not None:
+            audio_stage.set_audio_fields(batch)
+
+        with report.stage("diff"):
+            for row in batch.rows():
+                content = dict(zip(NOTE_FIELDS, row))
+                key = note_key(row)
+                dupes = existing.get(key)
+                if dupes is None:
+                    # The card's note may have been imported by an earlier version, with a reading that's missing syllables.
+                    legacy_key = find_legacy_key(legacy_keys[deck_name], key)
+                    if legacy_key is not None:
+                        dupes = existing[key] = existing[legacy_key]
+                if dupes is None:
+                    # Later cards with the same headword and reading are duplicates of the note this card would add.
+                    existing[key] = [content]
+                    report.notes_added += 1
+                    continue
+
+                report.dupes_found += len(dupes)
+                for note in dupes:
+                    changed = [name for name, value in content.items() if note.get(name, "") != value]
+                    if not changed:
+                        report.notes_identical += 1
+                        report.notes_skipped += 1
+                        continue
+                    for name in changed:
+                        report.field_changes[name] = report.field_changes.get(name, 0) + 1
+                    if config.overwrite:
+                        report.notes_updated += 1
+                        note.update(content)
+                    else:
+                        report.notes_skipped += 1
+
+        if progress is not None and not progress(report.cards_parsed, max(cards_total, report.cards_parsed)):
+            report.status = IMPORT_CANCELLED
+            break
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from os.path import dirname, realpath
+from typing import TYPE_CHECKING, Optional, Sequence
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+    from anki.decks import DeckId
+    from anki.models import NotetypeId
+    from anki.notes import NoteId
+
+    from .anki_manip import AnkiNotes
+
+from .anki_manip import note_key
+
+INDEX_DIR: str = dirname(realpath(__file__)) + "/user_files/content_index/" # Anki preserves user_files across add-on updates.
+
+def content_fingerprint(field_values: Sequence[str]) -> str:
+    """Returns a hash of the given, ordered field values of a note."""
+    return hashlib.blake2b("\x1f".join(field_values).encode("utf-8"), digest_size=16).hexdigest()
+
+def note_mods(col: Collection, model_id: NotetypeId) -> dict[NoteId, int]:
+    """Returns the modification time of every note of the given NoteType, using a single query."""
+    return dict(col.db.all("select id, mod from notes where mid = ?", model_id))
+
+class ContentIndex:
+    """A persisted index, for a single deck and NoteType, that maps the note_key() of each imported note to a fingerprint of
+    the content that was last written to it. Cards whose content matches the index can be skipped on re-import without
+    touching the collection.
+
+    Each entry also stores the modification time of its notes. Entries whose notes have since been edited or deleted
+    in Anki are discarded when the index is loaded, so the index never hides changes made outside of an import."""
+
+    def __init__(self, deck_id: DeckId, notes: AnkiNotes, mods: Optional[dict[NoteId, int]] = None):
+        """:param mods: The result of note_mods() for the NoteType, if it has already been read. 
+                        Lets the indexes of several decks share a single query."""
+        self.col = notes.col
+        self.model_id = notes.id
+        self.path = INDEX_DIR + f"{notes.id}-{deck_id}.json"
+        # Maps a note key to [fingerprint, [[note ID, note mod time], ...]].
+        self.entries: dict[str, list] = {}
+        # Maps a note key to the fingerprint and note IDs written during this import. Mod times are read back on save().
+        self.pending: dict[str, tuple[str, list[NoteId]]] = {}
+
+        entries = self.load()
+        if entries:
+            # Keep only the entries whose notes are exactly as the last import left them.
+            if mods is None:
+                mods = note_mods(self.col, self.model_id)
+            self.entries = {
+                key: entry for key, entry in entries.items()
+                if all(mods.get(note_id) == mod for note_id, mod in entry[1])
+            }
+
+    def load(self) -> dict[str, list]:
+        """Returns the entries saved to disk. An index that is missing or unreadable, e.g. because writing it 
+        was interrupted, is treated as empty, so its deck's cards are simply compared against the collection again."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError): # JSONDecodeError and UnicodeDecodeError are both ValueErrors.
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def is_unchanged(self, field_values: Sequence[str]) -> bool:
+        """Returns true if the given card's content, ordered as the NoteType's fields, is identical to what was 
+        last written to its note."""
+        entry = self.entries.get(note_key(field_values))
+        return entry is not None and entry[0] == content_fingerprint(field_values)
+
+    def note_ids(self, field_values: Sequence[str]) -> list[NoteId]:
+        """Returns the IDs of the notes that the given card's content was last written to."""
+        entry = self.entries.get(note_key(field_values))
+        return [note_id for note_id, _ in entry[1]] if entry is not None else []
+
+    def record(self, field_values: Sequence[str], modified_notes: list[tuple[NoteId, bool]]):
+        """Records that the given card's content, ordered as the NoteType's fields, was written to the notes with the given IDs."""
+        if not modified_notes:
+            return
+        self.pending[note_key(field_values)] = (content_fingerprint(field_values), [note_id for note_id, _ in modified_notes])
+
+    def save(self, mods: Optional[dict[NoteId, int]] = None):
+        """Writes the index, including every card recorded during this import, to disk.
+        
+        :param mods: The result of note_mods() for the NoteType, read after the import's last write."""
+        if self.pending:
+            if mods is None:
+                mods = note_mods(self.col, self.model_id)
+            for key, (fingerprint, note_ids) in self.pending.items():
+                self.entries[key] = [fingerprint, [[note_id, mods.get(note_id)] for note_id in note_ids]]
+            self.pending.clear()
+
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        # Write to a uniquely named temporary file first, so that neither an interrupted save nor two imports 
+        # saving the same index at once leave it half-written.
+        fd, temp_path = tempfile.mkstemp(dir=INDEX_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, self.path)
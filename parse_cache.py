@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import tempfile
+import zlib
+from os.path import dirname, realpath
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .pleco_import import NOTE_FIELDS, PARSER_VERSION, CardBatch
+from .tones import TONES_VERSION
+
+PARSE_CACHE_DIR: str = dirname(realpath(__file__)) + "/user_files/parse_cache/" # One file per parsed export.
+PARSE_CACHE_MAX_BYTES = 64 * 1024 * 1024 # The least recently used parses are evicted once the cache grows past this size.
+HASH_CHUNK_BYTES = 1024 * 1024
+
+CACHE_MAGIC = b"PLPB"
+HEADER = struct.Struct("<4sII")                     # Magic, parser version and number of batch records.
+RECORD = struct.Struct("<I")                        # The size of the record that follows.
+BATCH_CARDS = struct.Struct("<I")                   # The number of cards in a batch record.
+COLUMN_SIZES = struct.Struct(f"<{len(NOTE_FIELDS)}I") # The encoded size of each column, in NOTE_FIELDS order.
+SEPARATOR = "\x1f" # Separates the values of a column. Anki uses it to separate note fields, so no field can hold it.
+
+def file_digest(filename: str, digest: Optional[hashlib.blake2b] = None) -> str:
+    """Returns the hex digest of the file's content, read in chunks of HASH_CHUNK_BYTES. 
+    Anything already fed to `digest` is hashed first; by default it's a new 20-byte BLAKE2b hash."""
+    if digest is None:
+        digest = hashlib.blake2b(digest_size=20)
+    with open(filename, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def export_key(filename: str) -> str:
+    """Returns the cache key of a Pleco export: a hash of its format and content, along with the parser and tone
+    conversion versions and the note fields, so that cached parses are never reused after any of those change."""
+    digest = hashlib.blake2b(digest_size=20)
+    versions = f"{PARSER_VERSION}.{TONES_VERSION}"
+    digest.update(f"{versions}\x1f{SEPARATOR.join(NOTE_FIELDS)}\x1f{Path(filename).suffix}\x1f".encode("utf-8"))
+    return file_digest(filename, digest)
+
+class ParseCache:
+    """Stores the parsed cards of Pleco exports, so that re-importing an unchanged export skips parsing and tone conversion.
+
+    Each export's cards are saved in a compact binary file: a header, then one record per batch of cards, holding
+    the zlib-compressed column sizes, flags and columns, with the values of each column joined by SEPARATOR.
+    Batches are written as they are parsed and read back one at a time, so a cached export is never held in memory
+    whole. Files are evicted least recently used first, by their modification time, which is updated on every load."""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = PARSE_CACHE_MAX_BYTES):
+        self.directory = directory or PARSE_CACHE_DIR
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".bin")
+
+    def has(self, key: str) -> bool:
+        """Returns true if cards are cached for the given key. Cache files of another version of the add-on are removed."""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                header = f.read(HEADER.size)
+        except FileNotFoundError:
+            return False
+        if len(header) < HEADER.size or HEADER.unpack(header)[:2] != (CACHE_MAGIC, PARSER_VERSION):
+            os.remove(path)
+            return False
+        return True
+
+    def load(self, key: str) -> Iterator[CardBatch]:
+        """Yields the cached cards for the given key, one batch at a time. If the cache file turns out to be unreadable, 
+        it is removed and ValueError is raised, possibly after some batches were yielded; see importer.cached_batches."""
+        path = self.path(key)
+        os.utime(path) # Mark the parse as recently used.
+        with open(path, "rb") as f:
+            try:
+                _, _, records = HEADER.unpack(f.read(HEADER.size))
+                for _ in range(records):
+                    size, = RECORD.unpack(f.read(RECORD.size))
+                    data = f.read(size)
+                    if len(data) != size:
+                        raise ValueError("The cache file is truncated.")
+                    batch = decode_batch(data)
+                    yield batch
+            except (ValueError, struct.error, zlib.error, UnicodeDecodeError) as error:
+                f.close()
+                os.remove(path)
+                raise ValueError(f"The cached parse {path} is unreadable, and has been removed.") from error
+
+    def writer(self, key: str) -> CacheWriter:
+        """Returns a writer that caches cards under the given key, one batch at a time."""
+        return CacheWriter(self, key)
+
+    def evict(self):
+        """Deletes the least recently used parses until the cache holds at most max_bytes."""
+        if not os.path.isdir(self.directory):
+            return
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".bin")]
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+
+class CacheWriter:
+    """Writes the cards of one export to the cache as they are parsed. Nothing is cached until commit(); 
+    the batches are written to a temporary file first, so that a parse is never loaded half-written."""
+
+    def __init__(self, cache: ParseCache, key: str):
+        os.makedirs(cache.directory, exist_ok=True)
+        self.path = cache.path(key)
+        fd, self.temp_path = tempfile.mkstemp(dir=cache.directory, suffix=".tmp")
+        self.file = os.fdopen(fd, "wb")
+        self.file.write(HEADER.pack(CACHE_MAGIC, PARSER_VERSION, 0)) # The number of records is filled in by commit().
+        self.records = 0
+        self.encodable = True # False once a batch holds a value that can't be encoded, in which case the export isn't cached.
+
+    def write(self, batch: CardBatch):
+        if not self.encodable:
+            return
+        data = encode_batch(batch)
+        if data is None:
+            self.encodable = False
+            return
+        self.file.write(RECORD.pack(len(data)))
+        self.file.write(data)
+        self.records += 1
+
+    def commit(self):
+        """Caches the batches written so far, unless one of them couldn't be encoded."""
+        if not self.encodable:
+            self.discard()
+            return
+        self.file.seek(0)
+        self.file.write(HEADER.pack(CACHE_MAGIC, PARSER_VERSION, self.records))
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.temp_path)
+
+def encode_batch(batch: CardBatch) -> Optional[bytes]:
+    """Encodes the cards of the batch as a record of the cache's file format, or returns None if a value contains SEPARATOR."""
+    cards = len(batch)
+    blobs = []
+    for column in batch.columns:
+        text = SEPARATOR.join(column)
+        if text.count(SEPARATOR) != max(cards - 1, 0):
+            return None
+        blobs.append(text.encode("utf-8"))
+
+    payload = b"".join([COLUMN_SIZES.pack(*(len(blob) for blob in blobs)), bytes(batch.dict_type), bytes(batch.needs_check), *blobs])
+    return BATCH_CARDS.pack(cards) + zlib.compress(payload, 1)
+
+def decode_batch(data: bytes) -> CardBatch:
+    """Decodes a batch record written by encode_batch. Raises ValueError if the record is malformed."""
+    cards, = BATCH_CARDS.unpack_from(data)
+    payload = zlib.decompress(data[BATCH_CARDS.size:])
+
+    batch = CardBatch()
+    offset = COLUMN_SIZES.size
+    batch.dict_type = bytearray(payload[offset:offset + cards])
+    batch.needs_check = bytearray(payload[offset + cards:offset + 2 * cards])
+    offset += 2 * cards
+    for i, size in enumerate(COLUMN_SIZES.unpack_from(payload)):
+        column = payload[offset:offset + size].decode("utf-8").split(SEPARATOR) if cards else []
+        if len(column) != cards:
+            raise ValueError("The cached columns don't match the number of cards.")
+        batch.columns[i] = column
+        offset += size
+    return batch
@@ -1,107 +1,447 @@
+from __future__ import annotations
+
+import html
+import io
+import mmap
+import multiprocessing
+import os
 import re
-from dataclasses import dataclass
+import sys
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Iterator, Optional, Sequence
 from xml.etree import ElementTree as ET
 
-if __name__ == "__main__":
-    from string_parsing import contains_pua, is_pua
-    from tones import convert_numeric_sentence
-else:
-    from .string_parsing import contains_pua, is_pua
-    from .tones import convert_numeric_sentence
-
-@dataclass
-class NoteContent:
-    headword_sc:    str
-    pron:           str
-    defn:           str
-    notes:          Optional[str] = ""
-    audio:          Optional[str] = ""
-    reverse:        Optional[str] = ""
-
-@dataclass
-class Flashcard:
-    content:        NoteContent
-    dict_type:      Optional[bool] = False
-    needs_check:    Optional[bool] = False
-
-def parse_pleco_file(filename: str) -> list[Flashcard]:
+from .string_parsing import PUA
+from .tones import convert_numeric_sentence
+
+# https://regex101.com/r/oRAWLT/1
+TXT_CARD_RE = re.compile(r"((?:[\u4E00-\u9FFF。，])+)\t((?:[a-zA-Zü'。，.,]+[1-5]?[ (?:\/\/)。]*)+)\t(.+)")
+TXT_PRON_SPLIT_RE = re.compile("[ 。，..]")
+XML_CARD_TAG_RE = re.compile(rb"<card[\s>]")
+
+PARSER_VERSION = 3 # Increment whenever the parsed output of an export changes, so that cached parses are discarded. Tone conversion has tones.TONES_VERSION.
+PARALLEL_CHUNK_BYTES = 4 * 1024 * 1024 # The approximate size of the chunks that are handed to each parser process.
+CARD_BATCH_SIZE = 500 # The number of cards in each CardBatch yielded by the serial parsers.
+
+# The Private Use Area markers that Pleco uses to format dictionary definitions. 
+# Each entry maps an opening marker to its closing marker and the HTML tag and attributes it becomes.
+PUA_MARKUP = {
+    "\ueab1": ("\ueab2", "b", ""),                                    # Bold.
+    "\ueab3": ("\ueab4", "i", ""),                                    # Italics.
+    "\ueab5": ("\ueab6", "span", ' class="pleco-pos"'),               # Part of speech label.
+    "\ueab8": ("\ueabb", "span", ' class="pleco-link"'),              # Link to another entry.
+    "\ueac1": ("\ueac0", "span", ' class="pleco-colour-1"'),          # Coloured text.
+    "\ueac2": ("\ueac0", "span", ' class="pleco-colour-2"'),
+    "\ueac3": ("\ueac0", "span", ' class="pleco-colour-3"'),
+    "\ueac4": ("\ueac0", "span", ' class="pleco-colour-4"'),
+}
+PUA_VOID_MARKUP = {
+    "\ueab7": "<br>", # Line break.
+}
+
+# Converter tables derived from the markup above, built once at import time.
+PUA_OPEN_TAGS = {opener: f"<{tag}{attributes}>" for opener, (_, tag, attributes) in PUA_MARKUP.items()}
+PUA_CLOSE_TAGS = {opener: f"</{tag}>" for opener, (_, tag, _) in PUA_MARKUP.items()}
+PUA_VOID_TAGS = dict(PUA_VOID_MARKUP)
+# Maps each closing marker to the opening markers it closes. Markers shared by several openers (e.g. colours)
+# close whichever of them was opened most recently.
+PUA_CLOSE_MARKERS = {
+    closer: frozenset(opener for opener, (other, _, _) in PUA_MARKUP.items() if other == closer)
+    for closer, _, _ in PUA_MARKUP.values()
+}
+
+# The fields of a flashcard's note, in the order of the NoteType's fields. The headword must stay first.
+NOTE_FIELDS = ("headword_sc", "pron", "defn", "notes", "audio", "reverse", "headword_tc", "variants", "full_defn")
+FIELD_INDEX = {name: i for i, name in enumerate(NOTE_FIELDS)}
+
+class CardBatch:
+    """A batch of flashcards stored column-wise: one list of values per note field, in NOTE_FIELDS order, 
+    and one flag per card for whether it is a dictionary card and whether it needs checking by the user.
+    Parsers append cards to a batch directly, and the note writer reads them back as rows of field values,
+    so no object is built per card."""
+    __slots__ = ("columns", "dict_type", "needs_check")
+
+    def __init__(self):
+        self.columns: list[list[str]] = [[] for _ in NOTE_FIELDS]
+        self.dict_type = bytearray()
+        self.needs_check = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.dict_type)
+
+    def append(self, headword: str, pron: str, defn: str, dict_type: bool = False, needs_check: bool = False):
+        """Adds a card. Its other fields are left empty."""
+        columns = self.columns
+        columns[0].append(headword)
+        columns[1].append(pron)
+        columns[2].append(defn)
+        for column in columns[3:]:
+            column.append("")
+        self.dict_type.append(dict_type)
+        self.needs_check.append(needs_check)
+
+    def extend(self, other: CardBatch):
+        for column, other_column in zip(self.columns, other.columns):
+            column.extend(other_column)
+        self.dict_type += other.dict_type
+        self.needs_check += other.needs_check
+
+    def slice(self, start: int, end: int) -> CardBatch:
+        """Returns a new batch that holds the cards from index `start` up to `end`."""
+        batch = CardBatch()
+        batch.columns = [column[start:end] for column in self.columns]
+        batch.dict_type = self.dict_type[start:end]
+        batch.needs_check = self.needs_check[start:end]
+        return batch
+
+    def column(self, name: str) -> list[str]:
+        """Returns the values of the named field, one per card."""
+        return self.columns[FIELD_INDEX[name]]
+
+    def set_column(self, name: str, values: Sequence[str]):
+        """Replaces the values of the named field. There must be one value per card."""
+        self.columns[FIELD_INDEX[name]] = list(values)
+
+    def rows(self) -> list[tuple[str, ...]]:
+        """Returns the field values of each card, in NOTE_FIELDS order."""
+        return list(zip(*self.columns))
+
+def rebatch(batches: Iterable[CardBatch], size: int) -> Iterator[CardBatch]:
+    """Yields the cards of the given batches regrouped into batches of `size` cards. Only the last may be smaller."""
+    pending = CardBatch() # Cards left over from earlier batches, fewer than `size`.
+    for batch in batches:
+        start = 0
+        if pending:
+            start = size - len(pending)
+            pending.extend(batch.slice(0, start))
+            if len(pending) < size:
+                continue
+            yield pending
+        while len(batch) - start >= size:
+            yield batch if start == 0 and len(batch) == size else batch.slice(start, start + size)
+            start += size
+        pending = batch.slice(start, len(batch))
+    if pending:
+        yield pending
+
+def parse_pleco_file(filename: str, on_malformed: Optional[Callable[[int, str], None]] = None, workers: int = 1) -> Iterable[CardBatch]:
+    """Returns a stream of CardBatches holding the flashcards of the given Pleco export. Both formats are parsed lazily, 
+    so cards can be consumed while the file is still being read. Batches are of any non-zero size.
+    
+    :param on_malformed: Called with the line number and content of each unrecognised line of a .txt export.
+    :param workers: If greater than 1, the file is split into chunks that are parsed by this many processes.
+                    The cards are produced in the same order, and with the same content, as the serial parsers."""
+    if workers > 1:
+        return parse_pleco_parallel(filename, workers, on_malformed)
+
     if Path(filename).suffix == ".xml":
         return parse_pleco_xml(filename)
     elif Path(filename).suffix == ".txt":
-        return parse_pleco_txt(filename)
+        return parse_pleco_txt(filename, on_malformed)
 
     return []
 
-def parse_pleco_xml(filename: str) -> list[Flashcard]:
-    """Returns a list of Flashcard objects that contain the parsed and formatted data from a Pleco flashcard XML export."""
-    flashcards: list[Flashcard] = []
+def count_pleco_cards(filename: str) -> int:
+    """Quickly counts the cards in a Pleco export by scanning its raw bytes, without parsing any of them.
+    The count for a .txt export includes any malformed lines."""
+    suffix = Path(filename).suffix
+    if suffix not in (".xml", ".txt") or os.path.getsize(filename) == 0:
+        return 0
+
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if suffix == ".xml":
+            return sum(1 for _ in XML_CARD_TAG_RE.finditer(data))
+        # Every non-blank line of a .txt export, other than a category header, is a card.
+        return sum(1 for line in iter(data.readline, b"") if line.strip() and not line.lstrip(b"\xef\xbb\xbf").startswith(b"//"))
+
+def parse_pleco_xml(filename: str, batch_size: int = CARD_BATCH_SIZE) -> Iterator[CardBatch]:
+    """Yields CardBatches of `batch_size` cards that contain the parsed and formatted data from a Pleco flashcard XML export.
     
-    tree = ET.parse(filename)
-    root = tree.getroot()
-
-    for card in root.find("cards"):
-        back_info: ET.Element = card.find("entry") # The Pleco spec for XML isn't set in stone, so it's best not to use child indices to find tags.
-        headword = [(h.attrib.get("charset"), h.text) for h in back_info.findall("headword")]
-        pron = back_info.find("pron").text
-        defn = back_info.find("defn").text
-        
-        selected_headword = headword[0][1] #TODO select this based on either Simplified or Traditional.
-        # Check if this is a dictionary card.
-        dict_card = True if card.find("dictref") is not None else False
-        if dict_card:
-            flashcards.append(parse_dict_card(selected_headword, pron, defn))
-        # Otherwise the card is a custom card.
-        else:
-            flashcards.append(parse_user_card(selected_headword, pron, defn))
+    The file is parsed incrementally, one <card> element at a time, and each element is discarded once its
+    card has been added to the batch. Memory use therefore stays flat regardless of the size of the export."""
+    cards_element: Optional[ET.Element] = None # The <cards> element that holds every card in the export.
+    batch = CardBatch()
 
-    return flashcards
+    for event, element in ET.iterparse(filename, events=("start", "end")):
+        if event == "start":
+            if element.tag == "cards" and cards_element is None:
+                cards_element = element
+            continue
 
+        if element.tag == "card" and cards_element is not None:
+            parse_card_element(element, batch)
+            # Free the consumed card so that the tree never grows beyond a single card.
+            element.clear()
+            cards_element.remove(element)
+            if len(batch) == batch_size:
+                yield batch
+                batch = CardBatch()
+    if batch:
+        yield batch
+
+def parse_card_element(card: ET.Element, batch: CardBatch):
+    """Adds the card held by a single <card> element of a Pleco XML export to the batch."""
+    back_info: ET.Element = card.find("entry") # The Pleco spec for XML isn't set in stone, so it's best not to use child indices to find tags.
+    headword = [(h.attrib.get("charset"), h.text) for h in back_info.findall("headword")]
+    pron = back_info.find("pron").text
+    defn = back_info.find("defn").text
+    
+    selected_headword = headword[0][1] #TODO select this based on either Simplified or Traditional.
+    # Check if this is a dictionary card.
+    dict_card = True if card.find("dictref") is not None else False
+    if dict_card:
+        parse_dict_card(batch, selected_headword, pron, defn)
+    # Otherwise the card is a custom card.
+    else:
+        parse_user_card(batch, selected_headword, pron, defn)
 
-def parse_pleco_txt(filename: str) -> list[Flashcard]:
-    """Returns a list of Flashcard objects that contain the parsed and formatted data from a Pleco flashcard .txt file export."""
-    flashcards: list[Flashcard] = []
 
-    # https://regex101.com/r/oRAWLT/1
-    card_re = r"((?:[\u4E00-\u9FFF。，])+)\t((?:[a-zA-Zü'。，.,]+[1-5]?[ (?:\/\/)。]*)+)\t(.+)"
+def parse_pleco_txt(filename: str, on_malformed: Optional[Callable[[int, str], None]] = None) -> Iterator[CardBatch]:
+    """Yields CardBatches that contain the parsed and formatted data from a Pleco flashcard .txt file export.
+    
+    The file is read one line at a time. Lines that aren't recognised as cards are passed, along with their 
+    1-based line number, to `on_malformed`. By default they are reported with print."""
+    if on_malformed is None:
+        on_malformed = partial(report_malformed_line, filename)
+
     with open(filename, mode="r", encoding='utf-8-sig') as f:
-        flashcard_all = f.read()
-    cards = re.findall(card_re, flashcard_all)
-
-    card: tuple[str, str, str]
-    for card in cards:
-        headword, pron, defn = card
-        if len(re.split("[ 。，..]", pron)) == 1:
-            # Dict-type cards only contain a single word in their pronunciation.
-            # Parse the definition.
-            pass
+        yield from parse_txt_lines(f, on_malformed)
+
+def parse_txt_lines(lines: Iterable[str], on_malformed: Callable[[int, str], None], 
+                    batch_size: int = CARD_BATCH_SIZE) -> Iterator[CardBatch]:
+    """Yields CardBatches of `batch_size` cards from the card lines of a Pleco .txt export. 
+    Line numbers passed to `on_malformed` start at 1."""
+    batch = CardBatch()
+    for line_number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        # Skip blank lines and category headers.
+        if not line.strip() or line.startswith("//"):
+            continue
+
+        card = TXT_CARD_RE.search(line)
+        if card is None:
+            on_malformed(line_number, line)
+            continue
+
+        headword, pron, defn = card.groups()
+        # Dict-type cards only contain a single word in their pronunciation.
+        if len(TXT_PRON_SPLIT_RE.split(pron)) == 1:
+            parse_dict_card(batch, headword, pron, defn)
         else:
-            flashcards.append(Flashcard(NoteContent(headword, convert_numeric_sentence(pron), defn)))
+            parse_user_card(batch, headword, pron, defn)
+        if len(batch) == batch_size:
+            yield batch
+            batch = CardBatch()
+    if batch:
+        yield batch
 
-    return flashcards
+def report_malformed_line(filename: str, line_number: int, line: str):
+    """Reports a line of a Pleco .txt export that couldn't be parsed as a card."""
+    print(f"Skipping malformed line {line_number} of {filename}: {line!r}")
         
 
-def parse_dict_card(headword: str, pron: str, defn: str) -> Flashcard:
-    """Creates and returns a Flashcard object that contains the data of a dictionary-type Pleco flashcard."""
-    definitions: list[chr] = []
-    pua_present = False
-    for c in defn:
-        definitions.append(c)
-        if not is_pua(c):
-            pass
-        else:
-            pua_present = True
-    return Flashcard(NoteContent(headword, convert_numeric_sentence(pron), "".join(definitions)), True, pua_present)
+def parse_pleco_parallel(filename: str, workers: int, on_malformed: Optional[Callable[[int, str], None]] = None) -> Iterator[CardBatch]:
+    """Yields the cards of a Pleco export, one CardBatch per chunk, parsing and tone-converting chunks of the file in a pool of `workers` processes.
+    .txt exports are split into byte ranges aligned on line boundaries and .xml exports into ranges of whole <card> elements.
+    Chunks are merged back in file order, so the output is identical to parse_pleco_file's serial path."""
+    file_malformed = (lambda _, line_number, line: on_malformed(line_number, line)) if on_malformed is not None else None
+    for _, batch in parse_pleco_files([filename], file_malformed, workers):
+        yield batch
+
+def parse_pleco_files(filenames: Sequence[str], on_malformed: Optional[Callable[[str, int, str], None]] = None, 
+                      workers: int = 1) -> Iterator[tuple[str, CardBatch]]:
+    """Yields the cards of several Pleco exports as (filename, CardBatch) pairs, one file after another in the given order.
+    
+    :param on_malformed: Called with the filename, line number and content of each unrecognised line of a .txt export.
+    :param workers: If greater than 1, the chunks of every file are parsed in one pool of this many processes, 
+                    so later files are parsed while the cards of earlier ones are being consumed.
+                    0 picks the number with automatic_workers."""
+    if on_malformed is None:
+        on_malformed = report_malformed_line
+    if workers == 0:
+        workers = automatic_workers(filenames)
+    if workers <= 1 or not can_spawn_parsers():
+        for filename in filenames:
+            for batch in parse_pleco_file(filename, partial(on_malformed, filename)):
+                yield filename, batch
+        return
+
+    pool = parser_pool(workers)
+    try:
+        # Queue the chunks of every file before collecting any of them, so that no worker waits on the merge.
+        chunks = [(filename, submit_chunks(pool, filename)) for filename in filenames]
+        for filename, futures in chunks:
+            line_offset = 0 # The number of lines in all preceding chunks of a .txt export.
+            for future in futures:
+                result = future.result()
+                if isinstance(result, CardBatch):
+                    batch = result
+                else:
+                    batch, malformed, line_count = result
+                    for line_number, line in malformed:
+                        on_malformed(filename, line_offset + line_number, line)
+                    line_offset += line_count
+                if batch:
+                    yield filename, batch
+    finally:
+        # If the consumer stopped early, e.g. because the import was cancelled, drop the chunks that haven't
+        # started rather than waiting for the rest of every file to be parsed.
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def automatic_workers(filenames: Sequence[str]) -> int:
+    """Returns the number of parser processes worth starting for the given exports: one per chunk, up to one fewer
+    than the number of CPUs, so that the cards can be written while they're parsed. Exports that fit in a couple of
+    chunks are parsed serially, since they take less time to parse than the processes take to start."""
+    total_bytes = sum(os.path.getsize(filename) for filename in filenames)
+    if total_bytes < 2 * PARALLEL_CHUNK_BYTES:
+        return 1
+    return max(1, min((os.cpu_count() or 1) - 1, -(-total_bytes // PARALLEL_CHUNK_BYTES)))
+
+def parser_pool(workers: int) -> ProcessPoolExecutor:
+    """Returns a pool of `workers` parser processes.
+    
+    Workers are spawned rather than forked on every platform, since forking Anki's multi-threaded Qt process is
+    unsafe, and spawn is the only start method on Windows and the default on macOS. A spawned worker runs the
+    interpreter that sys.executable names and imports this module by its package name, which the add-on's
+    __init__ allows without a running Anki."""
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+def can_spawn_parsers() -> bool:
+    """Returns false in frozen builds of Anki, where sys.executable is Anki itself rather than an interpreter
+    that a spawned worker could run."""
+    return not getattr(sys, "frozen", False)
+
+def submit_chunks(pool: ProcessPoolExecutor, filename: str) -> list[Future]:
+    """Submits each chunk of a Pleco export to the pool, returning the futures of their parsed chunks in file order."""
+    suffix = Path(filename).suffix
+    if suffix == ".xml":
+        return [pool.submit(parse_xml_range, filename, start, end) for start, end in xml_chunk_ranges(filename, PARALLEL_CHUNK_BYTES)]
+    elif suffix == ".txt":
+        return [pool.submit(parse_txt_range, filename, start, end) for start, end in txt_chunk_ranges(filename, PARALLEL_CHUNK_BYTES)]
+    return []
+
+def pleco_exports_in(directory: str) -> list[str]:
+    """Returns the paths of the Pleco exports (.xml and .txt files) in the given directory and its sub-directories, sorted."""
+    return sorted(str(path) for path in Path(directory).rglob("*") if path.suffix in (".xml", ".txt") and path.is_file())
+
+def txt_chunk_ranges(filename: str, chunk_bytes: int) -> list[tuple[int, int]]:
+    """Splits a .txt export into (start, end) byte ranges of roughly `chunk_bytes`, each ending on a line boundary."""
+    ranges: list[tuple[int, int]] = []
+    with open(filename, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline() # Move to the end of the line that the chunk boundary falls in.
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
 
-def parse_user_card(headword: str, pron: str, defn: str) -> Flashcard:
-    """Creates and returns a Flashcard object that contains the data of a custom Pleco flashcard."""
-    return Flashcard(NoteContent(headword, convert_numeric_sentence(pron), defn))
+def xml_chunk_ranges(filename: str, chunk_bytes: int) -> list[tuple[int, int]]:
+    """Splits the <cards> element of an .xml export into (start, end) byte ranges of roughly `chunk_bytes`, 
+    each of which contains only whole <card> elements."""
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        cards_start = data.find(b"<cards")
+        cards_end = data.rfind(b"</cards>")
+        if cards_start < 0 or cards_end < 0:
+            return []
+
+        def next_card(position: int) -> int:
+            # Returns the position of the first <card> tag at or after the given position (but not <cards>).
+            match = XML_CARD_TAG_RE.search(data, position, cards_end)
+            return match.start() if match else cards_end
+
+        ranges: list[tuple[int, int]] = []
+        start = next_card(cards_start + len(b"<cards"))
+        while start < cards_end:
+            end = next_card(min(start + chunk_bytes, cards_end))
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def parse_txt_range(filename: str, start: int, end: int) -> tuple[CardBatch, list[tuple[int, str]], int]:
+    """Parses the lines of a .txt export that lie in the given byte range. Run in a worker process.
+    
+    :return A batch of the range's cards, its malformed lines (numbered from the start of the range) and its number of lines."""
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    malformed: list[tuple[int, str]] = []
+    lines = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig" if start == 0 else "utf-8")
+    batch = CardBatch()
+    for lines_batch in parse_txt_lines(lines, lambda line_number, line: malformed.append((line_number, line))):
+        batch.extend(lines_batch)
+    return batch, malformed, data.count(b"\n") + (0 if data.endswith(b"\n") or not data else 1)
+
+def parse_xml_range(filename: str, start: int, end: int) -> CardBatch:
+    """Parses the <card> elements of an .xml export that lie in the given byte range into one batch. Run in a worker process."""
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    cards = ET.fromstring(b"<cards>" + data + b"</cards>")
+    batch = CardBatch()
+    for card in cards.iter("card"):
+        parse_card_element(card, batch)
+    return batch
+
+def parse_dict_card(batch: CardBatch, headword: str, pron: str, defn: str):
+    """Adds the data of a dictionary-type Pleco flashcard to the batch.
+    The definition's PUA markup is converted to HTML; the card needs checking if it contained markers that aren't understood."""
+    html_defn, unknown_markers = pua_markup_to_html(defn or "")
+    batch.append(headword, convert_numeric_sentence(pron), html_defn, True, unknown_markers)
+
+def pua_markup_to_html(defn: str) -> tuple[str, bool]:
+    """Converts the Private Use Area markup of a Pleco dictionary definition into HTML in a single, linear pass.
+
+    Markers are matched against a stack of open tags. A closing marker closes every tag opened after its own and
+    reopens them afterwards, so improperly nested markup still produces well-formed HTML. Closing markers without
+    an open tag are dropped, and tags still open at the end of the definition are closed.
+
+    :return The HTML, and whether the definition contained any PUA code points that aren't known markers 
+            (these are dropped from the HTML).
+    """
+    if not PUA.contains(defn):
+        return html.escape(defn, quote=False), False
+
+    output: list[str] = []
+    open_markers: list[str] = []  # The opening markers of the tags that are currently open, innermost last.
+    unknown_markers = False
+    # Tokens alternate between text (even indices) and single PUA markers (odd indices).
+    for i, token in enumerate(PUA.split(defn)):
+        if i % 2 == 0:
+            if token:
+                output.append(html.escape(token, quote=False))
+        elif token in PUA_OPEN_TAGS:
+            open_markers.append(token)
+            output.append(PUA_OPEN_TAGS[token])
+        elif token in PUA_CLOSE_MARKERS:
+            openers = PUA_CLOSE_MARKERS[token]
+            # Find the innermost open tag that this marker closes.
+            depth = next((d for d in range(len(open_markers) - 1, -1, -1) if open_markers[d] in openers), None)
+            if depth is None:
+                continue # Unbalanced closing marker.
+            # Close the tag along with any tags that were opened inside it, then reopen those.
+            reopen = open_markers[depth + 1:]
+            output.extend(PUA_CLOSE_TAGS[marker] for marker in reversed(reopen))
+            output.append(PUA_CLOSE_TAGS[open_markers[depth]])
+            del open_markers[depth:]
+            for marker in reopen:
+                open_markers.append(marker)
+                output.append(PUA_OPEN_TAGS[marker])
+        elif token in PUA_VOID_TAGS:
+            output.append(PUA_VOID_TAGS[token])
+        else:
+            unknown_markers = True
 
-def test_import():
-    cards = parse_pleco_txt("./flash 4.txt")
-    for c in cards:
-        print(c)
+    # Close any tags that were left open.
+    output.extend(PUA_CLOSE_TAGS[marker] for marker in reversed(open_markers))
+    return "".join(output), unknown_markers
 
-if __name__ == "__main__":
-    test_import()
\ No newline at end of file
+def parse_user_card(batch: CardBatch, headword: str, pron: str, defn: str):
+    """Adds the data of a custom Pleco flashcard to the batch."""
+    batch.append(headword, convert_numeric_sentence(pron), defn)
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import cProfile
+import os
+import time
+import tracemalloc
+from dataclasses import replace
+from os.path import dirname, realpath
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    from .import_report import ImportReport
+    from .importer import ImportConfig
+
+PROFILE_DIR: str = dirname(realpath(__file__)) + "/user_files/profiles/" # Each profiled import writes to its own sub-folder.
+TRACEBACK_DEPTH = 25    # Frames kept per allocation, so allocations can be attributed to the phase that made them.
+TOP_ALLOCATIONS = 25    # The number of allocation sites listed for each phase.
+
+# Maps each phase of the import to the add-on modules whose frames identify it in an allocation's traceback.
+PHASE_MODULES = {
+    "parse":    ("pleco_import.py",),
+    "convert":  ("tones.py",),
+    "write":    ("anki_manip.py", "note_index.py"),
+}
+
+ProgressCallback = Callable[[int, int], bool]
+
+def profiled_config(config: ImportConfig) -> ImportConfig:
+    """Returns a copy of the config that parses the exports on the importing thread, without the parse cache. 
+    cProfile only profiles the thread it is run on, so the parse and convert phases would be missing from the profile 
+    of a pipelined or parallel import, and a cached export would only profile loading it from the cache."""
+    return replace(config, pipeline_depth=0, parse_workers=1, parse_cache=False)
+
+def profile_import(run_import: Callable[[Optional[ProgressCallback]], ImportReport], progress: Optional[ProgressCallback] = None) -> ImportReport:
+    """Runs an import under cProfile and tracemalloc, and saves the results to a new folder in PROFILE_DIR.
+    The folder's path is stored in the returned report.
+
+    :param run_import: Runs the import, passing the given progress callback on to import_pleco.
+                       Its config should be made with profiled_config(), so that parsing is profiled too.
+    :param progress: The progress callback of the caller. It is wrapped so that an allocation snapshot can be taken
+                     at the batch boundary with the highest memory use.
+    """
+    output_dir = PROFILE_DIR + time.strftime("%Y%m%d-%H%M%S") + "/"
+    os.makedirs(output_dir, exist_ok=True)
+
+    snapshot: Optional[tracemalloc.Snapshot] = None
+    snapshot_size = -1
+
+    def snapshot_progress(cards_done: int, cards_total: int) -> bool:
+        nonlocal snapshot, snapshot_size
+        current, _ = tracemalloc.get_traced_memory()
+        if current > snapshot_size:
+            snapshot, snapshot_size = tracemalloc.take_snapshot(), current
+        return progress(cards_done, cards_total) if progress is not None else True
+
+    profiler = cProfile.Profile()
+    tracemalloc.start(TRACEBACK_DEPTH)
+    try:
+        report = profiler.runcall(run_import, snapshot_progress)
+        _, peak = tracemalloc.get_traced_memory()
+        if snapshot is None:
+            snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    profiler.dump_stats(output_dir + "import.prof")
+    write_allocation_summary(output_dir + "allocations.txt", snapshot, peak)
+    report.profile_path = output_dir
+    return report
+
+def write_allocation_summary(filename: str, snapshot: tracemalloc.Snapshot, peak: int):
+    """Writes the top allocation sites of the snapshot, overall and for each phase of the import."""
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(f"Peak traced memory: {peak / 2**20:.1f} MiB\n")
+        f.write(f"Snapshot (taken at the batch boundary with the highest traced memory): "
+                f"{sum(stat.size for stat in snapshot.statistics('filename')) / 2**20:.1f} MiB\n")
+
+        phases = {"all": snapshot}
+        for phase, modules in PHASE_MODULES.items():
+            phases[phase] = snapshot.filter_traces([tracemalloc.Filter(True, "*" + module, all_frames=True) for module in modules])
+
+        for phase, phase_snapshot in phases.items():
+            stats = phase_snapshot.statistics("lineno")
+            f.write(f"\n[{phase}] {sum(stat.size for stat in stats) / 2**10:.1f} KiB\n")
+            for stat in stats[:TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
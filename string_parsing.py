@@ -1,11 +1,32 @@
-from unicodedata import category
+import re
+
+class PuaMatcher:
+    """Finds Private Use Area code points (U+E000–U+F8FF and supplementary planes 15 and 16) in strings.
+    Each operation is a single pass of a precompiled pattern, so no Python code runs per character."""
+
+    RANGES = "\ue000-\uf8ff\U000f0000-\U000ffffd\U00100000-\U0010fffd"
+
+    def __init__(self):
+        self.pattern = re.compile(f"[{self.RANGES}]")
+        self.split_pattern = re.compile(f"([{self.RANGES}])")
+
+    def contains(self, s: str) -> bool:
+        """Returns true if the string contains any PUA code point."""
+        return self.pattern.search(s) is not None
+
+    def find_all(self, s: str) -> list[tuple[int, str]]:
+        """Returns the index and value of every PUA code point in the string."""
+        return [(m.start(), m.group()) for m in self.pattern.finditer(s)]
+
+    def split(self, s: str) -> list[str]:
+        """Splits the string around its PUA code points. The result alternates between text (possibly empty) 
+        at even indices and single PUA code points at odd indices."""
+        return self.split_pattern.split(s)
+
+PUA = PuaMatcher()
 
 def is_pua(c: chr) -> bool:
-    return category(c) == "Co"
+    return PUA.pattern.fullmatch(c) is not None
 
 def contains_pua(s: str) -> bool:
-    for c in s:
-        if is_pua(c):
-            return True
-    
-    return False
\ No newline at end of file
+    return PUA.contains(s)
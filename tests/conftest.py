@@ -0,0 +1,19 @@
+"""Loads the add-on's modules for the tests as the benchmarks do, through benchmarks.addon, so that Anki isn't needed."""
+import sys
+from pathlib import Path
+
+import pytest
+
+ADDON_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ADDON_DIR))
+
+from benchmarks.addon import ADDON_PACKAGE
+
+@pytest.fixture
+def importable_addon(tmp_path, monkeypatch):
+    """Puts the add-on on sys.path under its package name, as Anki's add-on folder does, so that spawned parser
+    processes can import it."""
+    addons = tmp_path / "addons"
+    addons.mkdir()
+    (addons / ADDON_PACKAGE).symlink_to(ADDON_DIR, target_is_directory=True)
+    monkeypatch.syspath_prepend(str(addons))
@@ -0,0 +1,40 @@
+import pytest
+
+from benchmarks.addon import addon_module
+
+cedict = addon_module("cedict")
+
+DICTIONARY = """\
+# CC-CEDICT
+中國 中国 [Zhong1 guo2] /China/
+行 行 [xing2] /to walk/to be capable/
+行 行 [hang2] /row/line/
+妳 你 [ni3] /variant of 你[ni3]/
+你 你 [ni3] /you/
+"""
+
+@pytest.fixture
+def dictionary(tmp_path, monkeypatch):
+    monkeypatch.setattr(cedict, "CEDICT_INDEX_DIR", str(tmp_path / "index") + "/")
+    path = tmp_path / "cedict_ts.u8"
+    path.write_text(DICTIONARY, encoding="utf-8")
+    with cedict.CedictIndex.open(str(path)) as index:
+        yield index
+
+def test_lookup_by_tone_marks_or_numbers(dictionary):
+    expected = cedict.CedictEntry("中國", "", "China")
+    assert dictionary.lookup("中国", "Zhōng guó") == expected
+    assert dictionary.lookup("中国", "zhong1guo2") == expected
+
+def test_lookup_separates_readings(dictionary):
+    assert dictionary.lookup("行", "xíng").definitions == "to walk; to be capable"
+    assert dictionary.lookup("行", "háng").definitions == "row; line"
+
+def test_lookup_merges_entries_and_variants(dictionary):
+    assert dictionary.lookup("你", "nǐ") == cedict.CedictEntry("妳/你", "你[ni3]", "you")
+
+def test_lookup_misses(dictionary):
+    assert dictionary.lookup("行", "xing1") is None
+    assert dictionary.lookup("人", "rén") is None
+    assert dictionary.lookup("一", "yī") is None # Before every key.
+    assert dictionary.lookup("龘", "dá") is None # After every key.
@@ -0,0 +1,64 @@
+"""Tests of the import pipeline, run against the benchmarks' stand-ins for Anki's modules and collection.
+The Qt stand-ins are installed too, since pytest imports the add-on's __init__, which sets up the menu once `mw` exists."""
+import pytest
+
+from benchmarks.addon import addon_module
+from benchmarks.fake_collection import FakeCollection, install_stand_in_modules
+from benchmarks.generate import write_xml_export
+from benchmarks.startup import install_qt_stand_ins
+
+install_stand_in_modules(FakeCollection())
+install_qt_stand_ins()
+anki_manip = addon_module("anki_manip")
+importer = addon_module("importer")
+parse_cache = addon_module("parse_cache")
+
+def cards(stream) -> list:
+    return [(filename, card) for filename, batch in stream for card in zip(batch.rows(), batch.dict_type)]
+
+@pytest.fixture
+def exports(tmp_path):
+    xml_export, txt_export = str(tmp_path / "flash.xml"), str(tmp_path / "flash.txt")
+    write_xml_export(xml_export, 1200)
+    with open(txt_export, "w", encoding="utf-8") as f:
+        f.write("行\txing2\tto walk\nnot a card\n你好\tni3 hao3\thello\n")
+    return [xml_export, txt_export]
+
+def test_cached_parse_matches_parse(tmp_path, exports):
+    cache = parse_cache.ParseCache(str(tmp_path / "cache"))
+    parsed = cards(importer.file_batches(exports))
+    assert cards(importer.file_batches(exports, cache=cache)) == parsed # Cached as it's parsed.
+    assert cards(importer.file_batches(exports, cache=cache)) == parsed # Loaded from the cache.
+
+@pytest.mark.parametrize("keep", [0, 1 / 3, 2 / 3])
+def test_unreadable_cache_falls_back_to_parsing(tmp_path, exports, keep):
+    cache = parse_cache.ParseCache(str(tmp_path / "cache"))
+    parsed = cards(importer.file_batches(exports, cache=cache))
+    for path in (tmp_path / "cache").iterdir():
+        data = path.read_bytes()
+        path.write_bytes(data[:parse_cache.HEADER.size + int((len(data) - parse_cache.HEADER.size) * keep)])
+    assert cards(importer.file_batches(exports, cache=cache)) == parsed
+    assert list((tmp_path / "cache").iterdir()) == []
+
+def test_malformed_lines_are_reported(exports):
+    malformed = []
+    list(importer.file_batches(exports, on_malformed=lambda *line: malformed.append(line)))
+    assert malformed == [(exports[1], 2, "not a card")]
+
+@pytest.mark.parametrize("reading, legacy_reading", [
+    ("a1yi2", "yi2"), # 阿姨 "a1 yi2" was imported as "yí".
+    ("e4", ""),
+    ("lv4", ""),      # A capital Ü was dropped.
+])
+def test_legacy_readings_are_found(reading, legacy_reading):
+    keys = anki_manip.legacy_key_index([f"字\x1f{legacy_reading}", "字\x1fzi4"])
+    assert anki_manip.find_legacy_key(keys, f"字\x1f{reading}") == f"字\x1f{legacy_reading}"
+
+@pytest.mark.parametrize("reading, other_reading", [
+    ("hang2", "xing2"),         # Homographs.
+    ("dong1xi1", "dong1xi5"),   # Only the tone differs.
+    ("yi2", "a1yi2"),           # The existing reading is longer.
+])
+def test_other_readings_are_not_legacy(reading, other_reading):
+    keys = anki_manip.legacy_key_index([f"字\x1f{other_reading}"])
+    assert anki_manip.find_legacy_key(keys, f"字\x1f{reading}") is None
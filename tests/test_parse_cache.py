@@ -0,0 +1,84 @@
+import os
+import struct
+
+import pytest
+
+from benchmarks.addon import addon_module
+
+parse_cache = addon_module("parse_cache")
+CardBatch = addon_module("pleco_import").CardBatch
+
+def make_batch(count: int, start: int = 0) -> CardBatch:
+    batch = CardBatch()
+    for i in range(start, start + count):
+        batch.append(f"字{i}", f"zì {i}", f"<b>definition</b> {i}" if i % 2 else "", dict_type=i % 2 == 0, needs_check=i % 3 == 0)
+    return batch
+
+def cards(batches) -> list:
+    return [card for batch in batches for card in zip(batch.rows(), batch.dict_type, batch.needs_check)]
+
+def write_cache(cache, key: str, batches):
+    writer = cache.writer(key)
+    for batch in batches:
+        writer.write(batch)
+    writer.commit()
+
+@pytest.mark.parametrize("count", [0, 1, 7])
+def test_batch_round_trip(count):
+    batch = make_batch(count)
+    assert cards([parse_cache.decode_batch(parse_cache.encode_batch(batch))]) == cards([batch])
+
+def test_separator_in_a_value_is_not_encoded():
+    batch = make_batch(2)
+    batch.append("字", "zì", "a\x1fb")
+    assert parse_cache.encode_batch(batch) is None
+
+def test_cache_round_trip(tmp_path):
+    cache = parse_cache.ParseCache(str(tmp_path))
+    batches = [make_batch(3), make_batch(4, 3)]
+    write_cache(cache, "key", batches)
+    assert cache.has("key")
+    assert cards(cache.load("key")) == cards(batches)
+
+def test_discarded_writes_are_not_cached(tmp_path):
+    cache = parse_cache.ParseCache(str(tmp_path))
+    writer = cache.writer("key")
+    writer.write(make_batch(3))
+    writer.discard()
+    assert not cache.has("key")
+    assert list(tmp_path.iterdir()) == []
+
+def test_other_versions_are_removed(tmp_path):
+    cache = parse_cache.ParseCache(str(tmp_path))
+    write_cache(cache, "key", [make_batch(3)])
+    path = tmp_path / "key.bin"
+    data = bytearray(path.read_bytes())
+    struct.pack_into("<I", data, 4, parse_cache.PARSER_VERSION + 1)
+    path.write_bytes(data)
+    assert not cache.has("key")
+    assert not path.exists()
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data[:len(data) * 2 // 3],                                 # Truncated.
+    lambda data: data[:len(data) // 2] + b"\0" * 16 + data[len(data) // 2 + 16:], # Overwritten part-way.
+    lambda data: data[:8] + b"\xff\xff\0\0" + data[12:],                     # Too many records.
+])
+def test_unreadable_cache_raises_and_is_removed(tmp_path, corrupt):
+    cache = parse_cache.ParseCache(str(tmp_path))
+    write_cache(cache, "key", [make_batch(200), make_batch(200, 200)])
+    path = tmp_path / "key.bin"
+    path.write_bytes(corrupt(path.read_bytes()))
+    assert cache.has("key")
+    with pytest.raises(ValueError):
+        list(cache.load("key"))
+    assert not path.exists()
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = parse_cache.ParseCache(str(tmp_path))
+    for i, key in enumerate(["old", "new"]):
+        write_cache(cache, key, [make_batch(50)])
+        os.utime(tmp_path / f"{key}.bin", (i, i))
+    cache.max_bytes = (tmp_path / "new.bin").stat().st_size
+    cache.evict()
+    assert not cache.has("old")
+    assert cache.has("new")
@@ -0,0 +1,91 @@
+from benchmarks.addon import addon_module
+from benchmarks.generate import write_txt_export, write_xml_export
+
+pleco_import = addon_module("pleco_import")
+CardBatch = pleco_import.CardBatch
+pua_markup_to_html = pleco_import.pua_markup_to_html
+
+BOLD, END_BOLD = "\ueab1", "\ueab2"
+ITALIC, END_ITALIC = "\ueab3", "\ueab4"
+COLOUR_1, COLOUR_2, END_COLOUR = "\ueac1", "\ueac2", "\ueac0"
+LINE_BREAK = "\ueab7"
+
+def make_batch(count: int, start: int = 0) -> CardBatch:
+    batch = CardBatch()
+    for i in range(start, start + count):
+        batch.append(f"字{i}", f"zi{i}", f"definition {i}", dict_type=i % 2 == 0, needs_check=i % 3 == 0)
+    return batch
+
+def cards(batches) -> list:
+    return [card for batch in batches for card in zip(batch.rows(), batch.dict_type, batch.needs_check)]
+
+def test_markup_without_markers_is_escaped():
+    assert pua_markup_to_html("a<b & c") == ("a&lt;b &amp; c", False)
+
+def test_nested_markup():
+    html, unknown = pua_markup_to_html(f"{BOLD}a{ITALIC}b{END_ITALIC}c{END_BOLD}")
+    assert html == "<b>a<i>b</i>c</b>"
+    assert not unknown
+
+def test_overlapping_markup_is_reopened():
+    html, _ = pua_markup_to_html(f"{BOLD}a{ITALIC}b{END_BOLD}c{END_ITALIC}")
+    assert html == "<b>a<i>b</i></b><i>c</i>"
+
+def test_shared_closer_closes_latest_colour():
+    html, _ = pua_markup_to_html(f"{COLOUR_1}a{COLOUR_2}b{END_COLOUR}c{END_COLOUR}")
+    assert html == '<span class="pleco-colour-1">a<span class="pleco-colour-2">b</span>c</span>'
+
+def test_unbalanced_markers():
+    assert pua_markup_to_html(f"a{END_BOLD}b") == ("ab", False)
+    assert pua_markup_to_html(f"{BOLD}a") == ("<b>a</b>", False)
+
+def test_void_and_unknown_markers():
+    assert pua_markup_to_html(f"a{LINE_BREAK}b") == ("a<br>b", False)
+    assert pua_markup_to_html("a\ue000b") == ("ab", True) # Not a known marker.
+
+def test_rebatch_regroups_cards_in_order():
+    batches = [make_batch(3), make_batch(5, 3), make_batch(1, 8), make_batch(7, 9)]
+    regrouped = list(pleco_import.rebatch(batches, 4))
+    assert [len(batch) for batch in regrouped] == [4, 4, 4, 4]
+    assert cards(regrouped) == cards(batches)
+
+def test_rebatch_keeps_a_short_last_batch():
+    batches = [make_batch(5), make_batch(4, 5)]
+    regrouped = list(pleco_import.rebatch(batches, 4))
+    assert [len(batch) for batch in regrouped] == [4, 4, 1]
+    assert cards(regrouped) == cards(batches)
+    assert list(pleco_import.rebatch([], 4)) == []
+
+def test_txt_dictionary_cards_are_parsed(tmp_path):
+    export = tmp_path / "flash.txt"
+    export.write_text("// Category\n行\txing2\tto walk\n你好\tni3 hao3\thello\nnot a card\n", encoding="utf-8")
+    malformed = []
+    batches = list(pleco_import.parse_pleco_txt(str(export), lambda line_number, line: malformed.append((line_number, line))))
+    assert [(row[:3], dict_type) for row, dict_type, _ in cards(batches)] == [
+        (("行", "xíng", "to walk"), 1),
+        (("你好", "nǐ hǎo", "hello"), 0),
+    ]
+    assert malformed == [(4, "not a card")]
+    assert pleco_import.count_pleco_cards(str(export)) == 3 # Malformed lines are counted too.
+
+def test_parallel_parse_matches_serial(tmp_path, monkeypatch, importable_addon):
+    xml_export, txt_export = str(tmp_path / "flash.xml"), str(tmp_path / "flash.txt")
+    write_xml_export(xml_export, 600)
+    write_txt_export(txt_export, 600)
+    with open(txt_export, "a", encoding="utf-8") as f:
+        f.write("not a card\n")
+    # Small chunks, so that each export is split between several processes.
+    monkeypatch.setattr(pleco_import, "PARALLEL_CHUNK_BYTES", 16 * 1024)
+    assert len(pleco_import.xml_chunk_ranges(xml_export, 16 * 1024)) > 1
+    assert len(pleco_import.txt_chunk_ranges(txt_export, 16 * 1024)) > 1
+
+    def parse(workers: int):
+        malformed = []
+        parsed = [(filename, card) for filename, batch in pleco_import.parse_pleco_files(
+            [xml_export, txt_export], lambda *line: malformed.append(line), workers) for card in cards([batch])]
+        return parsed, malformed
+
+    serial, parallel = parse(1), parse(2)
+    assert len(serial[0]) == 1200
+    assert serial[1] == [(txt_export, 602, "not a card")] # After the category header and 600 cards.
+    assert parallel == serial
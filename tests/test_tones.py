@@ -0,0 +1,37 @@
+import pytest
+
+from benchmarks.addon import addon_module
+
+tones = addon_module("tones")
+
+@pytest.mark.parametrize("pinyin", ["Xíng rén", "xing2ren2", "XING2 REN2", "xíngrén"])
+def test_normalise_pinyin_ignores_form_case_and_spacing(pinyin):
+    assert tones.normalise_pinyin(pinyin) == "xing2ren2"
+
+@pytest.mark.parametrize("pinyin, normalised", [
+    ("lǜ", "lv4"),
+    ("lu:4", "lv4"),
+    ("nü3", "nv3"),
+    ("ma", "ma5"),
+    ("ma5", "ma5"),
+    ("Nǐ hǎo!", "ni3hao3"),
+    ("ā yí", "a1yi2"),
+])
+def test_normalise_pinyin(pinyin, normalised):
+    assert tones.normalise_pinyin(pinyin) == normalised
+
+@pytest.mark.parametrize("numeric, marked", [
+    ("ni3 hao3", "nǐ hǎo"),
+    ("Zhong1 guo2", "Zhōng guó"),
+    ("Ou1 zhou1", "Ōu zhōu"),
+    ("lü4", "lǜ"),
+    ("LÜ4", "LǛ"),
+    ("a1 yi2", "ā yí"),
+    ("e4", "è"),
+])
+def test_convert_numeric_sentence(numeric, marked):
+    assert tones.convert_numeric_sentence(numeric) == marked
+
+def test_converted_readings_normalise_back():
+    for numeric in ["ni3 hao3", "Zhong1 guo2", "a1 yi2", "lü4", "Er2 zi5"]:
+        assert tones.normalise_pinyin(tones.convert_numeric_sentence(numeric)) == tones.normalise_pinyin(numeric)
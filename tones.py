@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 from typing import Union
 
 TONE_MAP = {
@@ -12,7 +13,41 @@ TONE_MAP = {
 
 VOWELS = "aeiouü"
 
-WORD_PATTERN = r"([a-zA-Z'ü]{2,})([1-5]{1})?"
+WORD_PATTERN = r"([a-zA-Z'üÜ]+)([1-5]{1})?"
+WORD_RE = re.compile(WORD_PATTERN)
+
+WORD_CACHE_SIZE = 65536 # The maximum number of whole words whose conversions are memoised.
+# Increment whenever the output of convert_numeric_sentence changes, so that cached parses are discarded.
+# 2: single-letter syllables and capitalised vowels are converted.
+TONES_VERSION = 2
+
+# Every standard Mandarin syllable, without tones. Used to build SYLLABLE_TABLE once at import time.
+BASE_SYLLABLES = """
+a ai an ang ao e ei en eng er o ou
+ba bai ban bang bao bei ben beng bi bian biao bie bin bing bo bu
+pa pai pan pang pao pei pen peng pi pian piao pie pin ping po pou pu
+ma mai man mang mao me mei men meng mi mian miao mie min ming miu mo mou mu
+fa fan fang fei fen feng fo fou fu
+da dai dan dang dao de dei den deng di dia dian diao die ding diu dong dou du duan dui dun duo
+ta tai tan tang tao te teng ti tian tiao tie ting tong tou tu tuan tui tun tuo
+na nai nan nang nao ne nei nen neng ni nian niang niao nie nin ning niu nong nou nu nuan nun nuo nü nüe
+la lai lan lang lao le lei leng li lia lian liang liao lie lin ling liu lo long lou lu luan lun luo lü lüe
+ga gai gan gang gao ge gei gen geng gong gou gu gua guai guan guang gui gun guo
+ka kai kan kang kao ke kei ken keng kong kou ku kua kuai kuan kuang kui kun kuo
+ha hai han hang hao he hei hen heng hong hou hu hua huai huan huang hui hun huo
+ji jia jian jiang jiao jie jin jing jiong jiu ju juan jue jun
+qi qia qian qiang qiao qie qin qing qiong qiu qu quan que qun
+xi xia xian xiang xiao xie xin xing xiong xiu xu xuan xue xun
+zha zhai zhan zhang zhao zhe zhei zhen zheng zhi zhong zhou zhu zhua zhuai zhuan zhuang zhui zhun zhuo
+cha chai chan chang chao che chen cheng chi chong chou chu chua chuai chuan chuang chui chun chuo
+sha shai shan shang shao she shei shen sheng shi shou shu shua shuai shuan shuang shui shun shuo
+ra ran rang rao re ren reng ri rong rou ru rua ruan rui run ruo
+za zai zan zang zao ze zei zen zeng zi zong zou zu zuan zui zun zuo
+ca cai can cang cao ce cen ceng ci cong cou cu cuan cui cun cuo
+sa sai san sang sao se sen seng si song sou su suan sui sun suo
+ya yai yan yang yao ye yi yin ying yo yong you yu yuan yue yun
+wa wai wan wang wei wen weng wo wu
+"""
 
 
 def apply_tone(pinyin: str, tone: int) -> str:
@@ -27,10 +62,10 @@ def apply_tone(pinyin: str, tone: int) -> str:
         # Record the position of any capitalised letters.
         if c.isupper():
             capitalisation.append(i)
-        # Record the position of each vowel
-        if c in VOWELS:
+        # Record the position of each vowel, whatever its case.
+        if c.lower() in VOWELS:
             last_vowel = i
-            vowels_present[c] = i
+            vowels_present[c.lower()] = i
         new_pinyin.append(c.lower())
 
     # 'a' and 'e' take priority. There will never be both an 'a' and 'e' in a word.
@@ -48,7 +83,7 @@ def apply_tone(pinyin: str, tone: int) -> str:
             new_pinyin[o_pos] = TONE_MAP['o'][tone_index]
     # Otherwise the last vowel gets the tone.
     elif last_vowel > -1:
-        test_vowel = pinyin[last_vowel]
+        test_vowel = pinyin[last_vowel].lower()
         new_pinyin[last_vowel] = TONE_MAP[test_vowel][tone_index]
         
     for i in capitalisation:
@@ -58,23 +93,77 @@ def apply_tone(pinyin: str, tone: int) -> str:
 
 def convert_numeric_word(pinyin: str) -> str:
     """Takes a single Chinese word of pinyin indicated with tone numbers and returns the same word, indicated with tone marks."""
-    matches = re.findall(WORD_PATTERN, pinyin) # Split the word into the pinyin for its individual characters.
+    return _convert_numeric_word(pinyin)
 
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def _convert_numeric_word(pinyin: str) -> str:
     # For each character (NOT letter), convert from tone numbers to tone marks.
-    corrected_pinyin: str = ""
-    for numeric_pinyin in matches:
-        tone = 5
-        if numeric_pinyin[1] != "":
-            tone = int(numeric_pinyin[1])
-        corrected_pinyin += apply_tone(numeric_pinyin[0], tone)
-
-    return corrected_pinyin
+    # Known syllables are looked up in the precomputed table; anything else falls back to apply_tone.
+    return "".join(
+        SYLLABLE_TABLE.get(letters + (tone or "5")) or apply_tone(letters, int(tone or 5))
+        for letters, tone in WORD_RE.findall(pinyin) # Split the word into the pinyin for its individual characters.
+    )
 
 def convert_numeric_sentence(sentence: str) -> str:
     """Takes a sentence of pinyin indicated with tone numbers and returns the same sentence, indicated with tone marks."""
-    words: list[str] = sentence.split(" ")
-    for i, word in enumerate(words):
-        pinyin = convert_numeric_word(word)
-        words[i] = pinyin
+    return " ".join([_convert_numeric_word(word) for word in sentence.split(" ")])
+
+def normalise_pinyin(pinyin: str) -> str:
+    """Returns a canonical form of the given pinyin, written with either tone marks or tone numbers, that can be used 
+    to compare readings: lowercase syllables with tone numbers (5 for the neutral tone), "ü" spelled "v", and no spaces 
+    or punctuation. For example, "Xíng rén", "xing2ren2" and "XING2 REN2" all become "xing2ren2"."""
+    return "".join(_normalise_pinyin_word(word) for word in PINYIN_WORD_RE.findall(pinyin.lower()))
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def _normalise_pinyin_word(word: str) -> str:
+    word = word.replace("u:", "ü").replace("v", "ü")
+    if any(c.isdigit() for c in word):
+        # Tone numbers already mark the end of each syllable.
+        syllables = [(letters, int(tone or 5)) for letters, tone in NUMERIC_SYLLABLE_RE.findall(word)]
+    else:
+        # Strip the tone marks, remembering the tone of each marked vowel, then split the word into syllables.
+        letters = "".join(MARKED_VOWELS.get(c, (c, 0))[0] for c in word)
+        tones = [MARKED_VOWELS.get(c, (c, 0))[1] for c in word]
+        syllables = []
+        start = 0
+        for syllable in _split_syllables(letters) or [letters]:
+            end = start + len(syllable)
+            syllables.append((syllable, next((tone for tone in tones[start:end] if tone), 5)))
+            start = end
+    return "".join(letters.replace("ü", "v") + str(tone) for letters, tone in syllables)
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def _split_syllables(letters: str, first: bool = True) -> tuple[str, ...]:
+    """Splits toneless pinyin into standard syllables, preferring the longest syllable at each point.
+    Only the first syllable may start with "a", "e" or "o"; elsewhere, pinyin separates those with an apostrophe.
+    Returns an empty tuple if it can't be split."""
+    for end in range(min(len(letters), MAX_SYLLABLE_LENGTH), 0, -1):
+        syllable, rest = letters[:end], letters[end:]
+        if syllable not in SYLLABLES or (not first and syllable[0] in "aeo"):
+            continue
+        if not rest:
+            return (syllable,)
+        if rest_syllables := _split_syllables(rest, False):
+            return (syllable, *rest_syllables)
+    return ()
+
+def _build_syllable_table() -> dict[str, str]:
+    """Maps every numeric syllable (e.g. "zhong1"), in lower, capitalised and upper case and with both 
+    the "ü" and "v" spellings, to its tone-marked form."""
+    table: dict[str, str] = {}
+    for syllable in BASE_SYLLABLES.split():
+        spellings = (syllable, syllable.replace("ü", "v")) if "ü" in syllable else (syllable,)
+        for tone in range(1, 6):
+            marked = apply_tone(syllable, tone)
+            for spelling in spellings:
+                for case, marked_case in ((str.lower, str.lower), (str.capitalize, str.capitalize), (str.upper, str.upper)):
+                    table[case(spelling) + str(tone)] = marked_case(marked)
+    return table
 
-    return " ".join(words)
\ No newline at end of file
+SYLLABLE_TABLE = _build_syllable_table()
+SYLLABLES = frozenset(BASE_SYLLABLES.split())
+MAX_SYLLABLE_LENGTH = max(len(syllable) for syllable in SYLLABLES)
+# Maps each tone-marked vowel to its plain vowel and tone number.
+MARKED_VOWELS = {marked: (vowel, tone) for vowel, marks in TONE_MAP.items() for tone, marked in enumerate(marks[:4], 1)}
+PINYIN_WORD_RE = re.compile(f"(?:[a-zü:v1-5]|[{''.join(MARKED_VOWELS)}])+")
+NUMERIC_SYLLABLE_RE = re.compile(r"([a-zü]+)([1-5]?)")
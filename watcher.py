@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import html
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from os.path import dirname, realpath
+from typing import TYPE_CHECKING, Any, Optional
+
+from aqt import mw
+from aqt.operations import QueryOp
+from aqt.qt import QFileSystemWatcher, QTimer
+from aqt.utils import qconnect, tooltip
+
+from .importer import IMPORT_DONE, ImportConfig, import_pleco_files, plan_imports
+from .parse_cache import file_digest
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+
+    from .import_report import ImportReport
+
+WATCH_STATE_FILE: str = dirname(realpath(__file__)) + "/user_files/watch_state.json" # The last imported state of each watched export.
+WATCH_DEBOUNCE_SECONDS = 10 # Changes are imported once a folder has been quiet for this long, so that syncs in progress settle first.
+WATCH_POLL_SECONDS = 300    # How often folders are checked when they can't be watched for changes.
+
+@dataclass
+class WatchedFolder:
+    folder:     str # The folder whose exports, including those in sub-folders, are imported when they change.
+    deck:       str # The deck that the exports are imported into.
+    sub_decks:  bool = False # Import each export into a sub-deck of `deck` named after it, as plan_imports does.
+    options:    dict[str, Any] = field(default_factory=dict) # The ImportConfig fields the exports are imported with.
+
+    def import_config(self) -> ImportConfig:
+        options = {"overwrite": False, "set_new": False, **self.options}
+        return ImportConfig(**options)
+
+def watched_folders(addon_config: dict[str, Any]) -> list[WatchedFolder]:
+    """Returns the folders listed under "watch_folders" in the add-on's config. Options that aren't set for a folder
+    fall back to the add-on's own settings, such as its CC-CEDICT file."""
+    folders = []
+    for entry in addon_config.get("watch_folders", []):
+        options = {name: value for name, value in entry.items() if name not in ("folder", "deck", "sub_decks")}
+        options.setdefault("cedict_file", addon_config.get("cedict_file", ""))
+        options.setdefault("audio_engine", addon_config.get("audio_engine", ""))
+        options.setdefault("parse_workers", addon_config.get("parse_workers", 1))
+        folders.append(WatchedFolder(entry["folder"], entry["deck"], entry.get("sub_decks", False), options))
+    return folders
+
+class ExportStates:
+    """The size, modification time and content hash of each watched export when it was last imported, persisted in
+    WATCH_STATE_FILE. An export is only read again when its size or modification time change, and only re-imported
+    when its content has changed too."""
+
+    def __init__(self, path: str = WATCH_STATE_FILE):
+        self.path = path
+        # Maps the path of each export to [size, mtime in ns, content hash].
+        self.states: dict[str, list] = self.load()
+
+    def load(self) -> dict[str, list]:
+        """Returns the states saved to disk. A state file that is missing or unreadable is treated as empty,
+        so the watched exports are hashed again, and only those whose content differs from the deck are written."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                states = json.load(f)
+        except (OSError, ValueError): # JSONDecodeError and UnicodeDecodeError are both ValueErrors.
+            return {}
+        if not isinstance(states, dict):
+            return {}
+        return {filename: state for filename, state in states.items() if isinstance(state, list) and len(state) == 3}
+
+    def changed(self, filenames: list[str]) -> dict[str, list]:
+        """Returns the new state of each of the given exports whose content differs from when it was last imported.
+        Exports that were only touched have their size and modification time updated, and aren't returned."""
+        changed: dict[str, list] = {}
+        for filename in filenames:
+            try:
+                stat = os.stat(filename)
+            except FileNotFoundError:
+                continue # Removed since the folder was listed.
+            state = self.states.get(filename)
+            if state is not None and state[:2] == [stat.st_size, stat.st_mtime_ns]:
+                continue
+            digest = file_digest(filename)
+            if state is not None and state[2] == digest:
+                self.states[filename] = [stat.st_size, stat.st_mtime_ns, digest]
+            else:
+                changed[filename] = [stat.st_size, stat.st_mtime_ns, digest]
+        return changed
+
+    def update(self, states: dict[str, list]):
+        self.states.update(states)
+
+    def save(self):
+        os.makedirs(dirname(self.path), exist_ok=True)
+        # Write to a uniquely named temporary file first, so that an interrupted save never loses the states of other exports.
+        fd, temp_path = tempfile.mkstemp(dir=dirname(self.path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.states, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+class ExportWatcher:
+    """Imports the exports in the watched folders whenever they change, in the background.
+
+    Folders and exports are watched with QFileSystemWatcher, which uses the platform's change notifications
+    (inotify on Linux), so a quiet folder costs nothing. Folders that can't be watched that way are checked every
+    WATCH_POLL_SECONDS instead, by comparing the size and modification time of their exports. Either way, changes are
+    debounced for WATCH_DEBOUNCE_SECONDS, and only the exports whose content has changed are imported."""
+
+    def __init__(self, folders: list[WatchedFolder]):
+        self.folders = folders
+        self.states = ExportStates()
+        self.running = False # Whether an import of changed exports is running.
+        self.stopped = False # Whether the watcher has been stopped, e.g. because the profile is closing.
+        self.pending = False # Whether a change was seen while the import was running, so another check is needed.
+
+        self.fs_watcher = QFileSystemWatcher(mw)
+        qconnect(self.fs_watcher.directoryChanged, self.on_change)
+        qconnect(self.fs_watcher.fileChanged, self.on_change)
+        self.debounce = QTimer(mw)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(WATCH_DEBOUNCE_SECONDS * 1000)
+        qconnect(self.debounce.timeout, self.check)
+        self.poll = QTimer(mw)
+        self.poll.setInterval(WATCH_POLL_SECONDS * 1000)
+        qconnect(self.poll.timeout, self.check)
+
+    def start(self):
+        self.watch_paths()
+        # Check for the changes synced while Anki was closed.
+        self.debounce.start()
+
+    def stop(self):
+        self.stopped = True
+        self.debounce.stop()
+        self.poll.stop()
+        paths = self.fs_watcher.directories() + self.fs_watcher.files()
+        if paths:
+            self.fs_watcher.removePaths(paths)
+
+    def watch_paths(self):
+        """Watches each folder, its sub-folders and their exports, including any created since they were last listed.
+        Falls back to polling if any of them can't be watched."""
+        paths = []
+        missing = False # A folder that doesn't exist yet, e.g. before the first sync, is polled until it's created.
+        for folder in self.folders:
+            if not os.path.isdir(folder.folder):
+                missing = True
+                continue
+            for directory, _, filenames in os.walk(folder.folder):
+                paths.append(directory)
+                paths.extend(os.path.join(directory, name) for name in filenames if name.endswith((".xml", ".txt")))
+        watched = set(self.fs_watcher.directories() + self.fs_watcher.files())
+        new_paths = [path for path in paths if path not in watched]
+        failed = self.fs_watcher.addPaths(new_paths) if new_paths else []
+        if failed or missing:
+            if not self.poll.isActive():
+                self.poll.start()
+        else:
+            self.poll.stop()
+
+    def on_change(self, _path: str):
+        # Restart the countdown, so that a burst of changes is imported once.
+        self.debounce.start()
+
+    def check(self):
+        """Imports the exports that have changed since they were last imported, on a background thread."""
+        if self.running:
+            self.pending = True
+            return
+        if self.stopped or mw.col is None:
+            return
+        self.running = True
+        QueryOp(parent=mw, op=self.import_changes, success=self.on_imported).failure(self.on_failed).run_in_background()
+
+    def import_changes(self, col: Collection) -> list[ImportReport]:
+        reports = []
+        try:
+            for folder in self.folders:
+                if not os.path.isdir(folder.folder):
+                    continue
+                imports = plan_imports([folder.folder], folder.deck, folder.sub_decks)
+                changed = self.states.changed(list(imports))
+                if not changed:
+                    continue
+                report = import_pleco_files({filename: imports[filename] for filename in changed}, folder.import_config(), col=col)
+                # Exports that failed to import are tried again on the next change.
+                if report.status == IMPORT_DONE:
+                    self.states.update(changed)
+                reports.append(report)
+        finally:
+            self.states.save()
+        return reports
+
+    def on_imported(self, reports: list[ImportReport]):
+        self.finish()
+        if reports:
+            summaries = "<br>".join(report.summary().splitlines()[0] for report in reports)
+            tooltip(f"Imported changed Pleco exports:<br>{summaries}", period=5000)
+            if any(report.notes_added or report.notes_updated for report in reports):
+                mw.reset()
+
+    def on_failed(self, error: Exception):
+        self.finish()
+        # Shown as a tooltip rather than a dialog, since the import runs unprompted and is retried on the next change.
+        tooltip(f"Importing changed Pleco exports failed:<br>{html.escape(repr(error), quote=False)}", period=10000)
+
+    def finish(self):
+        self.running = False
+        if self.stopped:
+            return
+        # Files replaced by a sync are no longer watched, and new files and folders aren't yet.
+        self.watch_paths()
+        if self.pending:
+            self.pending = False
+            self.debounce.start()
+
+_watcher: Optional[ExportWatcher] = None # The watcher of the folders in the add-on's config, while a profile is open.
+
+def start_watching(addon_config: dict[str, Any]):
+    """Starts watching the folders in the add-on's config, replacing any watcher already running."""
+    global _watcher
+    stop_watching()
+    folders = watched_folders(addon_config)
+    if folders:
+        _watcher = ExportWatcher(folders)
+        _watcher.start()
+
+def stop_watching():
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None